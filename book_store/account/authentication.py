@@ -0,0 +1,160 @@
+"""
+Token authentication backed by a two-level cache of the resolved users.
+
+DRF's TokenAuthentication joins the token and user tables on every request.
+CachedTokenAuthentication keeps the fields of the resolved user that
+authentication and permission checks need in a bounded LRU inside the process
+and in the shared cache, so authenticating a known token costs no query. The
+password hash and the other fields are never cached, they stay deferred on the
+rebuilt user. Entries are evicted when the token is deleted or its user is
+saved, see account/signals.py. The eviction removes the shared entry and the
+local copy of the evicting process; other processes keep their local copy
+for at most TOKEN_CACHE_LOCAL_TIMEOUT seconds. This relies on the default
+cache being shared by all processes: with a per-process cache, a revoked
+token would stay valid elsewhere for up to TOKEN_CACHE_TIMEOUT seconds.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+CACHE_KEY = "auth-token:{digest}"
+USER_FIELDS = ("id", "email", "is_active", "is_staff", "is_superuser")
+
+
+class LocalCache:
+    """
+    Thread-safe LRU mapping with a bounded size and a per-entry time to live.
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Return the value stored under `key`, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Store `value` under `key`, evicting the least recently used entries when full.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalCache(
+    settings.TOKEN_CACHE_LOCAL_MAX_ENTRIES, settings.TOKEN_CACHE_LOCAL_TIMEOUT
+)
+
+
+def get_cache_key(key):
+    """
+    Return the cache key of a token, which does not contain the token itself.
+    """
+    return CACHE_KEY.format(digest=hashlib.sha256(key.encode()).hexdigest())
+
+
+def build_user(values):
+    """
+    Return a user instance rebuilt from its cached fields.
+
+    The other fields are deferred, so reading one of them loads it from the
+    database instead of the cache.
+    """
+    model = get_user_model()
+    # from_db expects the values in the order of the model's fields.
+    field_names = [
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.attname in values
+    ]
+    return model.from_db(None, field_names, [values[name] for name in field_names])
+
+
+def evict(*keys):
+    """
+    Remove the given tokens from the local and shared caches.
+
+    The tokens are evicted immediately and once more when the current
+    transaction commits, so a user cached by a concurrent request that still
+    saw the old state is not kept.
+    """
+    cache_keys = [get_cache_key(key) for key in keys]
+    if not cache_keys:
+        return
+
+    def delete():
+        cache.delete_many(cache_keys)
+        for cache_key in cache_keys:
+            local_cache.delete(cache_key)
+
+    delete()
+    transaction.on_commit(delete)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that resolves known tokens from the cache.
+
+    Only active users are cached. Unknown tokens and inactive users fall
+    through to TokenAuthentication, which rejects them.
+    """
+
+    def authenticate_credentials(self, key):
+        """
+        Return the user and token for `key`, looking them up in the database on a miss.
+
+        Args:
+            key (str): The token sent in the Authorization header.
+
+        Returns:
+            tuple: The user and an unsaved Token instance for the key.
+        """
+        cache_key = get_cache_key(key)
+        values = local_cache.get(cache_key)
+        if values is None:
+            values = cache.get(cache_key)
+            if values is None:
+                user, _ = super().authenticate_credentials(key)
+                values = {field: getattr(user, field) for field in USER_FIELDS}
+                cache.set(cache_key, values, settings.TOKEN_CACHE_TIMEOUT)
+            local_cache.set(cache_key, values)
+
+        # A new instance per request, so a view changing request.user cannot
+        # alter the cache.
+        user = build_user(values)
+        return user, self.get_model()(key=key, user=user)
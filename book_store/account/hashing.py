@@ -0,0 +1,57 @@
+"""
+Bounded executor for password hashing.
+
+Hashing a password with PBKDF2 takes tens of milliseconds of CPU. The async
+account views hand it to a dedicated thread pool instead of the worker that
+serves the request, so a burst of logins cannot starve the catalog endpoints.
+hashlib releases the GIL while it hashes, so the pool scales with the cores.
+
+At most PASSWORD_HASHING_MAX_WORKERS hashes run at once and at most
+PASSWORD_HASHING_MAX_PENDING more wait for a thread. Beyond that `run` raises
+HashingBusy straight away, which the views turn into a 503.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASHING_MAX_WORKERS,
+    thread_name_prefix="password-hashing",
+)
+slots = threading.BoundedSemaphore(
+    settings.PASSWORD_HASHING_MAX_WORKERS + settings.PASSWORD_HASHING_MAX_PENDING
+)
+
+
+class HashingBusy(Exception):
+    """
+    Raised when the hashing executor has no free slot for another hash.
+    """
+
+
+async def run(func, *args, **kwargs):
+    """
+    Run a hashing function in the executor without blocking the event loop.
+
+    Args:
+        func (callable): The function to run, e.g. `make_password`.
+        *args: Positional arguments for `func`.
+        **kwargs: Keyword arguments for `func`.
+
+    Returns:
+        The return value of `func`.
+
+    Raises:
+        HashingBusy: If the executor already has as many hashes as it accepts.
+    """
+    if not slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(func, *args, **kwargs)
+        )
+    finally:
+        slots.release()
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import evict
+
+
+@receiver(post_delete, sender=Token)
+def evict_deleted_token(sender, instance, **kwargs):
+    """
+    Stop authenticating a token from the cache once it is deleted.
+    """
+    evict(instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def evict_user_tokens(sender, instance, created, **kwargs):
+    """
+    Drop the cached copies of a user when it is saved, e.g. when it is deactivated.
+    """
+    if not created:
+        evict(*Token.objects.filter(user=instance).values_list("key", flat=True))
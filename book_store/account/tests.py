@@ -1,7 +1,14 @@
+from unittest.mock import patch
+
 from django.urls import reverse
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.test import APITestCase
 from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from . import hashing
+from .authentication import CachedTokenAuthentication, LocalCache, get_cache_key
 from .models import CustomUser
 
 
@@ -66,3 +73,164 @@ class AccountTests(APITestCase):
         response = self.client.post(url, data, format="json")
 
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AsyncAccountTests(APITestCase):
+    def setUp(self):
+        self.test_user = CustomUser.objects.create(
+            email="test@example.com", password=make_password("testpassword123")
+        )
+
+    def test_register_user(self):
+        """
+        Ensure we can create a new user through the async endpoint.
+        """
+        url = reverse("async_register_user")
+        data = {"email": "newuser@example.com", "password": "newpassword123"}
+        response = self.client.post(url, data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = CustomUser.objects.get(email="newuser@example.com")
+        self.assertTrue(user.check_password("newpassword123"))
+        self.assertTrue(Token.objects.filter(user=user).exists())
+
+    def test_register_user_with_existing_email(self):
+        """
+        Ensure we cannot create a user with an already existing email.
+        """
+        url = reverse("async_register_user")
+        data = {"email": "test@example.com", "password": "testpassword123"}
+        response = self.client.post(url, data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_register_user_with_incomplete_data(self):
+        """
+        Ensure that registration with incomplete data is not allowed.
+        """
+        url = reverse("async_register_user")
+        response = self.client.post(url, {"email": "a@example.com"}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_login_user(self):
+        """
+        Ensure we can login a user with correct credentials.
+        """
+        url = reverse("async_login_user")
+        data = {"email": "test@example.com", "password": "testpassword123"}
+        response = self.client.post(url, data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()["token"], Token.objects.get(user=self.test_user).key
+        )
+
+    def test_login_user_with_wrong_credentials(self):
+        """
+        Ensure user cannot login with a wrong password or an unknown email.
+        """
+        url = reverse("async_login_user")
+        for data in (
+            {"email": "test@example.com", "password": "wrongpassword"},
+            {"email": "unknown@example.com", "password": "testpassword123"},
+        ):
+            response = self.client.post(url, data, format="json")
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_rejected_when_hashing_is_saturated(self):
+        """
+        Ensure logins are rejected with a 503 instead of queueing without bound.
+        """
+        url = reverse("async_login_user")
+        data = {"email": "test@example.com", "password": "testpassword123"}
+        with patch.object(hashing.slots, "acquire", return_value=False):
+            response = self.client.post(url, data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "1")
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(
+            email="test@example.com", password=make_password("testpassword123")
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = CachedTokenAuthentication()
+
+    def test_cached_token_costs_no_query(self):
+        """
+        Ensure a token is only looked up in the database the first time it is used.
+        """
+        with self.assertNumQueries(1):
+            user, token = self.authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+
+        with self.assertNumQueries(0):
+            user, _ = self.authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+
+    def test_cached_user_has_no_credentials(self):
+        """
+        Ensure the password hash is not stored in the shared cache.
+        """
+        self.authentication.authenticate_credentials(self.token.key)
+        cached = cache.get(get_cache_key(self.token.key))
+        self.assertNotIn("password", cached)
+        self.assertNotIn(self.user.password, repr(cached))
+
+        with self.assertNumQueries(0):
+            user, _ = self.authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(user.email, self.user.email)
+        self.assertTrue(user.is_active)
+        self.assertFalse(user.is_staff)
+        self.assertIn("password", user.get_deferred_fields())
+
+    def test_request_is_authenticated_from_cache(self):
+        """
+        Ensure the cart can be requested with a cached token.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.assertEqual(self.client.get(reverse("cart")).status_code, 200)
+        self.assertEqual(self.client.get(reverse("cart")).status_code, 200)
+
+    def test_deleted_token_is_evicted(self):
+        """
+        Ensure a deleted token is rejected even after it was cached.
+        """
+        key = self.token.key
+        self.authentication.authenticate_credentials(key)
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(key)
+
+    def test_deactivated_user_is_evicted(self):
+        """
+        Ensure the token of a deactivated user is rejected even after it was cached.
+        """
+        self.authentication.authenticate_credentials(self.token.key)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_local_cache_is_bounded(self):
+        """
+        Ensure the local cache drops the least recently used and expired entries.
+        """
+        local_cache = LocalCache(max_entries=2, timeout=60)
+        local_cache.set("a", 1)
+        local_cache.set("b", 2)
+        local_cache.get("a")
+        local_cache.set("c", 3)
+        self.assertEqual(len(local_cache), 2)
+        self.assertIsNone(local_cache.get("b"))
+        self.assertEqual(local_cache.get("a"), 1)
+
+        expired = LocalCache(max_entries=2, timeout=0)
+        expired.set("a", 1)
+        self.assertIsNone(expired.get("a"))
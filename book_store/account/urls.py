@@ -1,7 +1,9 @@
 from django.urls import path
-from .views import register_user, login_user
+from .views import async_login_user, async_register_user, register_user, login_user
 
 urlpatterns = [
     path("register/", register_user, name="register_user"),
     path("login/", login_user, name="login_user"),
+    path("async/register/", async_register_user, name="async_register_user"),
+    path("async/login/", async_login_user, name="async_login_user"),
 ]
@@ -1,12 +1,17 @@
+import json
 import logging
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import make_password
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 
+from . import hashing
 from .models import CustomUser
 
 logger = logging.getLogger(__name__)
@@ -21,14 +26,21 @@ def register_user(request):
     password = request.data.get("password")
 
     if not all([email, password]):
-        logger.warning("Attempted user registration with incomplete data.")
+        logger.warning(
+            "Attempted user registration with incomplete data.",
+            extra={"event": "account.registration_incomplete"},
+        )
         return Response(
             {"error": "Both email and password are required."},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
     if CustomUser.objects.filter(email=email).exists():
-        logger.info(f"Attempted registration with already existing email: {email}")
+        logger.info(
+            "Attempted registration with already existing email: %s",
+            email,
+            extra={"event": "account.registration_duplicate"},
+        )
         return Response(
             {"error": "User with this email already exists."},
             status=status.HTTP_400_BAD_REQUEST,
@@ -36,7 +48,11 @@ def register_user(request):
 
     user = CustomUser.objects.create(email=email, password=make_password(password))
     Token.objects.create(user=user)
-    logger.info(f"New user registered with email: {email}")
+    logger.info(
+        "New user registered with email: %s",
+        email,
+        extra={"event": "account.registered", "user_id": user.pk},
+    )
 
     return Response(
         {"message": "User created successfully."}, status=status.HTTP_201_CREATED
@@ -54,10 +70,137 @@ def login_user(request):
 
     if user is not None:
         token, _ = Token.objects.get_or_create(user=user)
-        logger.info(f"User {email} logged in successfully.")
+        logger.info(
+            "User %s logged in successfully.",
+            email,
+            extra={"event": "account.login_succeeded", "user_id": user.pk},
+        )
         return Response({"token": token.key})
     else:
-        logger.warning(f"Failed login attempt for email: {email}")
+        logger.warning(
+            "Failed login attempt for email: %s",
+            email,
+            extra={"event": "account.login_failed"},
+        )
         return Response(
             {"error": "Invalid credentials."}, status=status.HTTP_401_UNAUTHORIZED
         )
+
+
+def read_credentials(request):
+    """
+    Return the email and password sent as JSON or form data.
+    """
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+    else:
+        data = request.POST
+    return data.get("email"), data.get("password")
+
+
+def hashing_busy_response():
+    logger.warning(
+        "Password hashing executor is saturated, rejecting request.",
+        extra={"event": "account.hashing_busy"},
+    )
+    return JsonResponse(
+        {"error": "The server is busy, please try again."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
+
+@csrf_exempt
+@require_POST
+async def async_register_user(request):
+    """
+    Async API view to register a new user.
+
+    The password is hashed in the bounded hashing executor, so under ASGI the
+    request does not occupy a worker thread while it waits for the hash.
+    """
+    email, password = read_credentials(request)
+
+    if not all([email, password]):
+        logger.warning(
+            "Attempted user registration with incomplete data.",
+            extra={"event": "account.registration_incomplete"},
+        )
+        return JsonResponse(
+            {"error": "Both email and password are required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if await CustomUser.objects.filter(email=email).aexists():
+        logger.info(
+            "Attempted registration with already existing email: %s",
+            email,
+            extra={"event": "account.registration_duplicate"},
+        )
+        return JsonResponse(
+            {"error": "User with this email already exists."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        password = await hashing.run(make_password, password)
+    except hashing.HashingBusy:
+        return hashing_busy_response()
+
+    user = await CustomUser.objects.acreate(email=email, password=password)
+    await Token.objects.acreate(user=user)
+    logger.info(
+        "New user registered with email: %s",
+        email,
+        extra={"event": "account.registered", "user_id": user.pk},
+    )
+
+    return JsonResponse(
+        {"message": "User created successfully."}, status=status.HTTP_201_CREATED
+    )
+
+
+@csrf_exempt
+@require_POST
+async def async_login_user(request):
+    """
+    Async API view to log in a user.
+
+    The user is looked up with the async ORM and the password is checked in
+    the bounded hashing executor. Like ModelBackend, a password is hashed for
+    unknown emails too, so response times do not reveal which emails exist.
+    """
+    email, password = read_credentials(request)
+    user = await CustomUser.objects.filter(email=email).afirst() if email else None
+
+    try:
+        if user is None:
+            await hashing.run(CustomUser().set_password, password)
+            authenticated = False
+        else:
+            authenticated = await hashing.run(user.check_password, password)
+    except hashing.HashingBusy:
+        return hashing_busy_response()
+
+    if authenticated and user.is_active:
+        token, _ = await Token.objects.aget_or_create(user=user)
+        logger.info(
+            "User %s logged in successfully.",
+            email,
+            extra={"event": "account.login_succeeded", "user_id": user.pk},
+        )
+        return JsonResponse({"token": token.key})
+    else:
+        logger.warning(
+            "Failed login attempt for email: %s",
+            email,
+            extra={"event": "account.login_failed"},
+        )
+        return JsonResponse(
+            {"error": "Invalid credentials."}, status=status.HTTP_401_UNAUTHORIZED
+        )
@@ -0,0 +1,9 @@
+"""
+Benchmark App
+
+This Django app holds the repeatable performance benchmark suite of the bookstore API.
+It bulk-seeds a configurable catalog (books, categories, users and carts) inside a transaction that is rolled back,
+times the book, cart and checkout endpoints in-process, and records latency percentiles and query counts.
+Results can be saved as a baseline and later runs compared against it, failing when a regression exceeds a threshold.
+The suite is run with `python manage.py benchmark` and has no models of its own.
+"""
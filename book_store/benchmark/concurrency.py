@@ -0,0 +1,187 @@
+"""
+Slow-client concurrency benchmark of the ASGI and WSGI deployments.
+
+Both applications are driven in process by simulated clients that all connect
+at once, send a GET request and then take `client_delay` seconds to read the
+response. A WSGI worker serves each client on one of its threads, which stays
+busy until the response has been read, so it holds at most `threads`
+connections at a time. The ASGI worker awaits the slow reads on its event
+loop and can hold every connection at once.
+"""
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+
+from .runner import percentile
+
+
+class Gauge:
+    """
+    Thread-safe count of the connections in progress and of its peak.
+    """
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def exit(self):
+        with self._lock:
+            self.current -= 1
+
+
+def summarize(latencies, statuses, gauge, duration):
+    """
+    Return the statistics of one run in milliseconds, rounded for reporting.
+    """
+    return {
+        "clients": len(latencies),
+        "held_peak": gauge.peak,
+        "errors": sum(1 for status in statuses if status != 200),
+        "duration_s": round(duration, 3),
+        "requests_per_s": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+def run_asgi(path, clients, client_delay):
+    """
+    Serve `clients` concurrent slow clients with one ASGI application instance.
+
+    Args:
+        path (str): The path and query string to request.
+        clients (int): Number of clients that connect at once.
+        client_delay (float): Seconds each client takes to read its response.
+
+    Returns:
+        dict: The statistics of the run, see `summarize`.
+    """
+    application = ASGIHandler()
+    url = urlsplit(path)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"testserver")],
+        "server": ("testserver", 80),
+        "client": ("127.0.0.1", 0),
+    }
+    gauge = Gauge()
+    latencies = []
+    statuses = []
+
+    async def client(start):
+        requested = False
+        disconnected = asyncio.Event()
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+            elif not message.get("more_body", False):
+                await asyncio.sleep(client_delay)
+
+        gauge.enter()
+        try:
+            await application(dict(scope), receive, send)
+        finally:
+            gauge.exit()
+            disconnected.set()
+        latencies.append(time.perf_counter() - start)
+
+    async def main():
+        start = time.perf_counter()
+        await asyncio.gather(*(client(start) for _ in range(clients)))
+        return time.perf_counter() - start
+
+    duration = asyncio.run(main())
+    return summarize(latencies, statuses, gauge, duration)
+
+
+def run_wsgi(path, clients, client_delay, threads):
+    """
+    Serve `clients` concurrent slow clients with a WSGI worker of `threads` threads.
+
+    Args:
+        path (str): The path and query string to request.
+        clients (int): Number of clients that connect at once.
+        client_delay (float): Seconds each client takes to read its response.
+        threads (int): Number of threads of the worker.
+
+    Returns:
+        dict: The statistics of the run, see `summarize`.
+    """
+    application = WSGIHandler()
+    url = urlsplit(path)
+    gauge = Gauge()
+    statuses = []
+
+    def client(start):
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": url.path,
+            "QUERY_STRING": url.query,
+            "SCRIPT_NAME": "",
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": "testserver",
+            "REMOTE_ADDR": "127.0.0.1",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(int(status.split()[0]))
+
+        gauge.enter()
+        try:
+            response = application(environ, start_response)
+            try:
+                for _ in response:
+                    pass
+                # The thread stays busy while the client reads the response.
+                time.sleep(client_delay)
+            finally:
+                response.close()
+        finally:
+            gauge.exit()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(client, [start] * clients))
+    duration = time.perf_counter() - start
+    return summarize(latencies, statuses, gauge, duration)
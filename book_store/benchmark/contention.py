@@ -0,0 +1,72 @@
+"""
+Write-contention benchmark of book reservations on one row and on stock slots.
+
+Worker threads reserve copies of the same book at once, each reservation in
+its own transaction on the thread's own database connection, as concurrent
+add-to-cart requests do. A book that is not sharded takes every reservation on
+its row, while a sharded book spreads them over its stock slots.
+
+The comparison is only meaningful on a database with row-level locks, such as
+PostgreSQL: SQLite serializes every write on the whole database file.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import DatabaseError, connections
+
+from .runner import percentile
+from book.models import Book
+
+
+def run_reservations(book_id, workers, reservations):
+    """
+    Reserve `reservations` copies of a book, one at a time, from `workers` threads.
+
+    Args:
+        book_id (int): Id of the book to reserve.
+        workers (int): Number of threads reserving at once.
+        reservations (int): Total number of reservations attempted.
+
+    Returns:
+        dict: The statistics of the run, with latencies in milliseconds.
+    """
+    start_barrier = threading.Barrier(workers)
+    shares = [
+        reservations // workers + (index < reservations % workers)
+        for index in range(workers)
+    ]
+
+    def worker(share):
+        latencies = []
+        reserved = errors = 0
+        try:
+            start_barrier.wait()
+            for _ in range(share):
+                start = time.perf_counter()
+                try:
+                    reserved += Book.objects.reserve(book_id)
+                except DatabaseError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+        finally:
+            connections.close_all()
+        return latencies, reserved, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(worker, shares))
+    duration = time.perf_counter() - start
+
+    latencies = [latency for result in results for latency in result[0]]
+    return {
+        "workers": workers,
+        "attempted": len(latencies),
+        "reserved": sum(result[1] for result in results),
+        "errors": sum(result[2] for result in results),
+        "duration_s": round(duration, 3),
+        "reservations_per_s": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
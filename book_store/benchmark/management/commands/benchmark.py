@@ -0,0 +1,110 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from benchmark.runner import build_scenarios, compare, run_scenario
+from benchmark.seeding import seed_catalog, seed_users
+from book.models import Book
+
+
+class Command(BaseCommand):
+    """
+    Run the catalog, cart and checkout benchmarks.
+
+    The data is seeded inside a transaction that is rolled back at the end, so
+    the command can be run against any database without leaving data behind.
+    """
+
+    help = "Benchmark the book, cart and checkout endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--books", type=int, default=10000, help="Number of books to seed."
+        )
+        parser.add_argument(
+            "--categories", type=int, default=50, help="Number of categories to seed."
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=None,
+            help="Number of users with a cart to seed. Defaults to --iterations.",
+        )
+        parser.add_argument(
+            "--cart-items", type=int, default=5, help="Number of items in each cart."
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=50,
+            help="Number of timed requests per scenario.",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            dest="scenarios",
+            help="Only run the named scenario. Can be repeated.",
+        )
+        parser.add_argument(
+            "--cached",
+            action="store_true",
+            help="Keep the response cache between requests.",
+        )
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+        parser.add_argument(
+            "--baseline", help="Compare the results with this baseline JSON file."
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Allowed p95 latency growth over the baseline, as a fraction.",
+        )
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        users_count = options["users"] or iterations
+
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=["testserver"]):
+            category_ids = seed_catalog(options["books"], options["categories"])
+            book_ids = list(Book.objects.order_by("id").values_list("id", flat=True))
+            users = seed_users(users_count, options["cart_items"], book_ids)
+            self.stdout.write(
+                f"Seeded {len(book_ids)} books, {len(category_ids)} categories "
+                f"and {len(users)} users."
+            )
+
+            client = APIClient()
+            results = {}
+            for name, request_factory in build_scenarios(
+                book_ids, category_ids, users, options["cart_items"]
+            ):
+                if options["scenarios"] and name not in options["scenarios"]:
+                    continue
+                results[name] = run_scenario(
+                    client, request_factory, iterations, cached=options["cached"]
+                )
+                self.stdout.write(
+                    "{name}: p50={p50_ms}ms p95={p95_ms}ms p99={p99_ms}ms "
+                    "queries={max_queries}".format(name=name, **results[name])
+                )
+
+            transaction.set_rollback(True)
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline:
+                regressions = compare(
+                    results, json.load(baseline), options["threshold"]
+                )
+            if regressions:
+                raise CommandError(
+                    "Performance regressions:\n" + "\n".join(regressions)
+                )
+            self.stdout.write("No regressions against the baseline.")
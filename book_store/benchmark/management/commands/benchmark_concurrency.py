@@ -0,0 +1,79 @@
+import json
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from benchmark.concurrency import run_asgi, run_wsgi
+from benchmark.seeding import seed_catalog
+from category.models import Category
+
+
+class Command(BaseCommand):
+    """
+    Compare how many slow clients one ASGI and one WSGI worker hold at once.
+
+    The ASGI worker serves the async book list and the WSGI worker the
+    BookViewSet list. Both handlers run their database queries on other
+    threads than the command, so the seeded catalog is committed and deleted
+    again at the end.
+    """
+
+    help = "Benchmark slow-client concurrency of the ASGI and WSGI deployments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--books", type=int, default=1000, help="Number of books to seed."
+        )
+        parser.add_argument(
+            "--clients",
+            type=int,
+            default=200,
+            help="Number of clients that connect at once.",
+        )
+        parser.add_argument(
+            "--client-delay",
+            type=float,
+            default=0.2,
+            help="Seconds each client takes to read its response.",
+        )
+        parser.add_argument(
+            "--wsgi-threads",
+            type=int,
+            default=8,
+            help="Number of threads of the WSGI worker.",
+        )
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        category_ids = seed_catalog(options["books"], 10)
+        try:
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                cache.clear()
+                results = {
+                    "asgi": run_asgi(
+                        reverse("book-async-list"),
+                        options["clients"],
+                        options["client_delay"],
+                    ),
+                    "wsgi": run_wsgi(
+                        reverse("book-list"),
+                        options["clients"],
+                        options["client_delay"],
+                        options["wsgi_threads"],
+                    ),
+                }
+        finally:
+            Category.objects.filter(pk__in=category_ids).delete()
+
+        for name, result in results.items():
+            self.stdout.write(
+                "{name}: held={held_peak}/{clients} errors={errors} "
+                "rps={requests_per_s} p50={p50_ms}ms p95={p95_ms}ms "
+                "max={max_ms}ms".format(name=name, **result)
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2, sort_keys=True)
@@ -0,0 +1,77 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmark.contention import run_reservations
+from book.models import Book, StockSlot
+from category.models import Category
+
+
+class Command(BaseCommand):
+    """
+    Compare the reservation throughput of one book row and of sharded stock slots.
+
+    Two books with enough stock for every reservation are seeded: one keeps
+    its stock on its row and the other is split over `--slots` stock slots.
+    The worker threads use connections of their own, so the books are
+    committed and deleted again at the end.
+    """
+
+    help = "Benchmark concurrent reservations of a single-row and a sharded book."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=16,
+            help="Number of threads reserving at once.",
+        )
+        parser.add_argument(
+            "--reservations",
+            type=int,
+            default=2000,
+            help="Number of reservations attempted per book.",
+        )
+        parser.add_argument(
+            "--slots",
+            type=int,
+            default=16,
+            help="Number of stock slots of the sharded book.",
+        )
+        parser.add_argument("--output", help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name="Benchmark Contention")
+        try:
+            books = {
+                mode: Book.objects.create(
+                    title=f"Benchmark Contention {mode}",
+                    author="Benchmark Author",
+                    year_published=2000,
+                    price="19.90",
+                    stock=options["reservations"],
+                    category=category,
+                )
+                for mode in ("single", "sharded")
+            }
+            StockSlot.objects.split(books["sharded"].pk, options["slots"])
+
+            results = {
+                mode: run_reservations(
+                    book.pk, options["workers"], options["reservations"]
+                )
+                for mode, book in books.items()
+            }
+        finally:
+            category.delete()
+
+        for mode, result in results.items():
+            self.stdout.write(
+                "{mode}: reserved={reserved}/{attempted} errors={errors} "
+                "rps={reservations_per_s} p50={p50_ms}ms p95={p95_ms}ms "
+                "max={max_ms}ms".format(mode=mode, **result)
+            )
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2, sort_keys=True)
@@ -0,0 +1,155 @@
+import math
+import statistics
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from book_store.cache import invalidate
+
+
+class BenchmarkError(Exception):
+    """
+    Raised when a benchmarked request does not succeed.
+    """
+
+
+def percentile(values, pct):
+    """
+    Return the nearest-rank percentile `pct` (0-100) of `values`.
+    """
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def build_scenarios(book_ids, category_ids, users, items_per_cart):
+    """
+    Return the benchmark scenarios as (name, request factory) pairs.
+
+    A request factory takes the iteration number and returns the HTTP method,
+    the path and the user (or None) of the request to time. Scenarios that
+    change state use a different user on every iteration, and checkout comes
+    last because it empties the carts.
+    """
+    book_count = len(book_ids)
+    author = f"Benchmark Author {book_count // 2 % 5000}"
+
+    def book(iteration):
+        return book_ids[iteration * 7919 % book_count]
+
+    return [
+        ("book-list", lambda i: ("get", reverse("book-list"), None)),
+        (
+            "book-list-deep-page",
+            lambda i: (
+                "get",
+                f"{reverse('book-list')}?page={max(book_count // 100, 1)}",
+                None,
+            ),
+        ),
+        (
+            "book-list-page-size-1000",
+            lambda i: ("get", f"{reverse('book-list')}?page_size=1000", None),
+        ),
+        (
+            "book-filter-author",
+            lambda i: ("get", f"{reverse('book-list')}?author={author}", None),
+        ),
+        (
+            "book-filter-categories",
+            lambda i: (
+                "get",
+                f"{reverse('book-list')}?categories={category_ids[0]}"
+                f"&categories={category_ids[-1]}",
+                None,
+            ),
+        ),
+        (
+            "book-retrieve",
+            lambda i: ("get", reverse("book-detail", kwargs={"pk": book(i)}), None),
+        ),
+        ("cart-view", lambda i: ("get", reverse("cart"), users[i % len(users)])),
+        (
+            "cart-add",
+            lambda i: (
+                "post",
+                reverse(
+                    "add-to-cart",
+                    kwargs={"book_id": book_ids[(i + items_per_cart) % book_count]},
+                ),
+                users[i % len(users)],
+            ),
+        ),
+        ("checkout", lambda i: ("post", reverse("checkout"), users[i % len(users)])),
+    ]
+
+
+def run_scenario(client, request_factory, iterations, cached=False):
+    """
+    Time `iterations` requests of a scenario and summarize them.
+
+    Unless `cached` is set, the response cache is invalidated before every
+    request so that the timings cover the uncached path.
+
+    Returns:
+        dict: Latency percentiles in milliseconds and the largest query count.
+    """
+    durations = []
+    queries = []
+    for iteration in range(iterations):
+        if not cached:
+            invalidate("books", "categories")
+        method, path, user = request_factory(iteration)
+        client.force_authenticate(user=user)
+
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = getattr(client, method)(path)
+            durations.append(time.perf_counter() - start)
+
+        if response.status_code >= 400:
+            raise BenchmarkError(
+                f"{method.upper()} {path} returned {response.status_code}."
+            )
+        queries.append(len(context.captured_queries))
+
+    return {
+        "iterations": iterations,
+        "mean_ms": round(statistics.mean(durations) * 1000, 3),
+        "p50_ms": round(percentile(durations, 50) * 1000, 3),
+        "p95_ms": round(percentile(durations, 95) * 1000, 3),
+        "p99_ms": round(percentile(durations, 99) * 1000, 3),
+        "max_queries": max(queries),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare benchmark results with a baseline.
+
+    A scenario regresses when its p95 latency grows by more than `threshold`
+    (a fraction, 0.2 meaning 20%) or when it issues more queries.
+
+    Returns:
+        list: A description of every regression found.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+
+        limit = base["p95_ms"] * (1 + threshold)
+        if result["p95_ms"] > limit:
+            regressions.append(
+                f"{name}: p95 {result['p95_ms']:.3f}ms exceeds "
+                f"baseline {base['p95_ms']:.3f}ms by more than {threshold:.0%}"
+            )
+        if result["max_queries"] > base["max_queries"]:
+            regressions.append(
+                f"{name}: {result['max_queries']} queries, "
+                f"baseline {base['max_queries']}"
+            )
+    return regressions
@@ -0,0 +1,92 @@
+import itertools
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from book.models import Book
+from cart.models import Cart, CartItem
+from category.models import Category
+
+User = get_user_model()
+
+
+def batched(iterable, size):
+    """
+    Yield lists of at most `size` items from `iterable`.
+    """
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def seed_catalog(books, categories, batch_size=5000):
+    """
+    Bulk-create a catalog of `books` in-stock books spread over `categories` categories.
+
+    Books are generated lazily and inserted in batches, so memory use does not
+    grow with the size of the catalog.
+
+    Returns:
+        list: The ids of the created categories.
+    """
+    category_objects = Category.objects.bulk_create(
+        [Category(name=f"Benchmark Category {index}") for index in range(categories)]
+    )
+    category_ids = [category.id for category in category_objects]
+
+    generator = (
+        Book(
+            title=f"Benchmark Book {index:07d}",
+            author=f"Benchmark Author {index % 5000}",
+            year_published=1900 + index % 120,
+            price="19.90",
+            stock=1000,
+            category_id=category_ids[index % categories],
+        )
+        for index in range(books)
+    )
+    for batch in batched(generator, batch_size):
+        Book.objects.bulk_create(batch)
+    Category.objects.reconcile_counts()
+
+    return category_ids
+
+
+def seed_users(count, items_per_cart, book_ids, batch_size=5000):
+    """
+    Bulk-create `count` users, each with a cart holding `items_per_cart` books.
+
+    The users have an unusable password, so seeding does not pay for password
+    hashing. The reserved counters of the books are updated in one query.
+
+    Returns:
+        list: The created users.
+    """
+    password = make_password(None)
+    users = []
+    for batch in batched(
+        (
+            User(email=f"benchmark{index}@example.com", password=password)
+            for index in range(count)
+        ),
+        batch_size,
+    ):
+        users.extend(User.objects.bulk_create(batch))
+
+    carts = []
+    for batch in batched((Cart(user=user) for user in users), batch_size):
+        carts.extend(Cart.objects.bulk_create(batch))
+
+    reserved = {}
+    items = (
+        CartItem(cart=cart, book_id=book_ids[(index + offset) % len(book_ids)])
+        for index, cart in enumerate(carts)
+        for offset in range(items_per_cart)
+    )
+    for batch in batched(items, batch_size):
+        CartItem.objects.bulk_create(batch)
+        for item in batch:
+            reserved[item.book_id] = reserved.get(item.book_id, 0) + item.quantity
+    Book.objects.adjust_reserved(reserved)
+
+    return users
@@ -0,0 +1,100 @@
+import io
+import json
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from .runner import compare, percentile
+from book.models import Book
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([3.0], 99) == 3.0
+
+
+def test_compare_reports_latency_and_query_regressions():
+    baseline = {
+        "book-list": {"p95_ms": 10.0, "max_queries": 2},
+        "checkout": {"p95_ms": 10.0, "max_queries": 6},
+    }
+    results = {
+        "book-list": {"p95_ms": 11.9, "max_queries": 2},
+        "checkout": {"p95_ms": 12.5, "max_queries": 7},
+        "cart-view": {"p95_ms": 100.0, "max_queries": 50},
+    }
+    regressions = compare(results, baseline, threshold=0.2)
+    assert len(regressions) == 2
+    assert all(regression.startswith("checkout") for regression in regressions)
+
+
+@pytest.mark.django_db
+def test_benchmark_command(tmp_path):
+    output = tmp_path / "results.json"
+    call_command(
+        "benchmark",
+        books=50,
+        categories=3,
+        iterations=3,
+        output=str(output),
+        stdout=io.StringIO(),
+    )
+    results = json.loads(output.read_text())
+    assert {"book-list", "book-retrieve", "cart-add", "checkout"} <= set(results)
+    assert not Book.objects.exists()
+
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(
+        json.dumps(
+            {name: {"p95_ms": 0.0, "max_queries": 0} for name in results},
+        )
+    )
+    with pytest.raises(CommandError):
+        call_command(
+            "benchmark",
+            books=50,
+            categories=3,
+            iterations=3,
+            scenario=["book-list"],
+            baseline=str(baseline),
+            stdout=io.StringIO(),
+        )
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_concurrency_command(tmp_path):
+    output = tmp_path / "results.json"
+    call_command(
+        "benchmark_concurrency",
+        books=20,
+        clients=6,
+        client_delay=0.01,
+        wsgi_threads=2,
+        output=str(output),
+        stdout=io.StringIO(),
+    )
+    results = json.loads(output.read_text())
+    assert results["asgi"]["errors"] == results["wsgi"]["errors"] == 0
+    assert results["asgi"]["held_peak"] == 6
+    assert results["wsgi"]["held_peak"] <= 2
+    assert not Book.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_stock_contention_command(tmp_path):
+    output = tmp_path / "results.json"
+    call_command(
+        "benchmark_stock_contention",
+        workers=2,
+        reservations=20,
+        slots=4,
+        output=str(output),
+        stdout=io.StringIO(),
+    )
+    results = json.loads(output.read_text())
+    for result in results.values():
+        assert result["attempted"] == 20
+        assert result["reserved"] + result["errors"] == 20
+    assert not Book.objects.exists()
@@ -1,12 +1,43 @@
+from django.conf import settings
 from django.contrib import admin
 
-from .models import Book
+from .models import Book, StockMovement, StockSlot
 
 
 class BookAdmin(admin.ModelAdmin):
-    list_display = ("title", "author", "year_published", "price", "category", "stock")
+    list_display = (
+        "title",
+        "author",
+        "year_published",
+        "price",
+        "category",
+        "stock",
+        "reserved",
+    )
     list_filter = ("category", "author", "year_published")
     search_fields = ("title", "author")
+    actions = ["shard_stock", "unshard_stock"]
+
+    @admin.action(description="Split the stock into slots for a promotion")
+    def shard_stock(self, request, queryset):
+        for book_id in queryset.values_list("pk", flat=True):
+            StockSlot.objects.split(book_id, settings.STOCK_SLOTS)
+
+    @admin.action(description="Gather the stock slots back")
+    def unshard_stock(self, request, queryset):
+        for book_id in queryset.values_list("pk", flat=True):
+            StockSlot.objects.split(book_id, 0)
+
+
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ("book", "kind", "quantity", "folded", "created_at")
+    list_filter = ("kind", "folded")
+    list_select_related = ("book",)
+    raw_id_fields = ("book",)
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 admin.site.register(Book, BookAdmin)
+admin.site.register(StockMovement, StockMovementAdmin)
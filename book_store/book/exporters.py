@@ -0,0 +1,61 @@
+"""
+Streaming export of the in-stock catalog as CSV or JSON Lines (NDJSON).
+
+The rows are read by a single query through a chunked iterator, which uses a
+server-side cursor on databases that support one, and are encoded one chunk at
+a time, so memory use does not grow with the size of the catalog. Exported
+files can be imported again with book.importers.
+"""
+import csv
+import itertools
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .serializers import BookRowSerializer
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+}
+
+
+class Echo:
+    """
+    File-like object whose `write` returns the value instead of storing it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_books(queryset, file_format, chunk_size=2000):
+    """
+    Yield the export of the book rows of `queryset`, one chunk of rows at a time.
+
+    Args:
+        queryset (QuerySet): Books, as rows from `values(*BookRowSerializer.value_fields())`.
+        file_format (str): One of the keys of CONTENT_TYPES.
+        chunk_size (int): Number of rows fetched and encoded at a time.
+
+    Yields:
+        str: The encoded rows of a chunk, preceded by the header line for CSV.
+    """
+    serializer = BookRowSerializer()
+    fields = BookRowSerializer.field_names()
+
+    if file_format == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+
+        def encode(data):
+            return writer.writerow([data[name] for name in fields])
+
+    else:
+
+        def encode(data):
+            return json.dumps(data, cls=JSONEncoder) + "\n"
+
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        yield "".join(encode(serializer.to_representation(row)) for row in chunk)
@@ -0,0 +1,211 @@
+import csv
+import itertools
+import json
+
+from django.db import connection, transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from .models import Book
+from .serializers import BookSerializer
+from .signals import stock_changed
+from category.models import Category
+
+FORMATS = ("csv", "jsonl")
+
+
+class BookImportSerializer(BookSerializer):
+    """
+    Serializer for one row of a book import.
+
+    The category may be given by id or by name, and is looked up in the
+    `categories` context instead of the database, so that a whole chunk of rows
+    is validated with a single category query.
+    """
+
+    category = serializers.CharField()
+
+    def validate_category(self, value):
+        """Check that the category is one of the categories resolved for the chunk."""
+        category = self.context["categories"].get(value.strip())
+        if category is None:
+            raise serializers.ValidationError("This category does not exist.")
+        return category
+
+    def validate(self, data):
+        return data
+
+
+class ImportReport:
+    """
+    Outcome of a book import.
+
+    Attributes:
+        created (int): Number of books created.
+        failed (int): Number of rows that were rejected.
+        errors (list): Errors of the first `max_errors` rejected rows, each with
+            the row number and the validation errors.
+        undecodable (bool): Whether reading stopped because the file is not
+            valid UTF-8.
+    """
+
+    def __init__(self, max_errors=1000):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.undecodable = False
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row_number, "errors": errors})
+
+    def as_dict(self):
+        return {"created": self.created, "failed": self.failed, "errors": self.errors}
+
+
+def read_rows(stream, file_format):
+    """
+    Yield (row number, row, error) tuples from a CSV or JSON Lines text stream.
+
+    Rows are read lazily. A row that cannot be parsed is yielded with a None row
+    and an error message instead of stopping the import. When the stream cannot
+    be decoded, the UnicodeDecodeError is yielded as the error of the row it was
+    reached at and nothing more is read.
+    """
+    if file_format == "csv":
+        parse = csv.DictReader(stream).__next__
+    elif file_format == "jsonl":
+        parse = iter(stream).__next__
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+    row_number = 0
+    while True:
+        row_number += 1
+        try:
+            row = parse()
+        except StopIteration:
+            return
+        except UnicodeDecodeError as error:
+            yield row_number, None, error
+            return
+        except csv.Error as error:
+            yield row_number, None, f"Invalid CSV: {error}"
+            continue
+
+        if file_format == "csv":
+            yield row_number, row, None
+            continue
+
+        if not row.strip():
+            continue
+        try:
+            row = json.loads(row)
+        except ValueError as error:
+            yield row_number, None, f"Invalid JSON: {error}"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, "Each line must be a JSON object."
+            continue
+        yield row_number, row, None
+
+
+def parse_category_id(reference):
+    """
+    Return the category id a reference stands for, or None if it is not one.
+
+    References that are not integers, or that are out of the range of the
+    category ids, can only name a category, and are otherwise reported as
+    unknown categories by the rows that use them.
+    """
+    try:
+        pk = int(reference)
+    except ValueError:
+        return None
+    low, high = connection.ops.integer_field_range(
+        Category._meta.pk.get_internal_type()
+    )
+    if (low is not None and pk < low) or (high is not None and pk > high):
+        return None
+    return pk
+
+
+def resolve_categories(rows):
+    """
+    Return the categories referenced by a chunk of rows, keyed by id and by name.
+    """
+    references = {
+        str(row.get("category", "")).strip()
+        for _, row, _ in rows
+        if row is not None and row.get("category") not in (None, "")
+    }
+    if not references:
+        return {}
+
+    ids = [pk for pk in map(parse_category_id, references) if pk is not None]
+    categories = {}
+    for category in Category.objects.filter(Q(name__in=references) | Q(id__in=ids)):
+        categories.setdefault(str(category.id), category)
+        categories[category.name] = category
+    return categories
+
+
+def import_books(stream, file_format, chunk_size=1000, max_errors=1000):
+    """
+    Import books from a CSV or JSON Lines text stream.
+
+    Rows are validated in chunks of `chunk_size`. Each chunk resolves its
+    categories with one query and inserts its valid rows with one bulk_create,
+    in its own transaction. Invalid rows are reported and skipped. Memory use
+    depends on the chunk size, not on the size of the file.
+
+    Args:
+        stream: A text stream with the rows to import.
+        file_format (str): Either "csv" or "jsonl".
+        chunk_size (int): Number of rows validated and inserted at a time.
+        max_errors (int): Number of row errors kept in the report.
+
+    Returns:
+        ImportReport: The number of created books and the rejected rows.
+    """
+    report = ImportReport(max_errors=max_errors)
+    rows = read_rows(stream, file_format)
+
+    while chunk := list(itertools.islice(rows, chunk_size)):
+        categories = resolve_categories(chunk)
+        books = []
+        for row_number, row, error in chunk:
+            if isinstance(error, UnicodeDecodeError):
+                report.undecodable = True
+                error = f"The file is not valid UTF-8: {error}"
+            if error is not None:
+                report.add_error(row_number, {"non_field_errors": [error]})
+                continue
+
+            serializer = BookImportSerializer(
+                data=row, context={"categories": categories}
+            )
+            if serializer.is_valid():
+                books.append(Book(**serializer.validated_data))
+            else:
+                report.add_error(row_number, serializer.errors)
+
+        if books:
+            book_counts = {}
+            in_stock_counts = {}
+            for book in books:
+                book_counts[book.category_id] = book_counts.get(book.category_id, 0) + 1
+                in_stock_counts[book.category_id] = in_stock_counts.get(
+                    book.category_id, 0
+                ) + (book.stock > 0)
+            with transaction.atomic():
+                created = Book.objects.bulk_create(books)
+                Category.objects.adjust_counts(book_counts, in_stock_counts)
+            report.created += len(created)
+            stock_changed.send(
+                sender=Book, book_ids=[book.pk for book in created if book.pk]
+            )
+
+    return report
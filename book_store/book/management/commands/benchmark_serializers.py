@@ -0,0 +1,106 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from book.models import Book
+from book.serializers import BookRowSerializer, BookSerializer
+from category.models import Category
+
+
+class Command(BaseCommand):
+    """
+    Compare BookSerializer with BookRowSerializer on book list pages.
+
+    The catalog is seeded inside a transaction that is rolled back at the end,
+    so the command can be run against any database without leaving data behind.
+    Each measurement covers the query, the serialization and the JSON rendering
+    of one page.
+    """
+
+    help = "Benchmark the model and row serializers used by the book list."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--page-sizes",
+            nargs="+",
+            type=int,
+            default=[100, 1000],
+            help="Page sizes to benchmark.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Number of timed runs per page size and serializer.",
+        )
+
+    def handle(self, *args, **options):
+        page_sizes = options["page_sizes"]
+        repeat = options["repeat"]
+
+        with transaction.atomic():
+            self.seed(max(page_sizes))
+            queryset = Book.objects.with_effective_stock().order_by("title", "id")
+            renderer = JSONRenderer()
+
+            for page_size in page_sizes:
+
+                def render_models():
+                    page = list(queryset[:page_size])
+                    return renderer.render(BookSerializer(page, many=True).data)
+
+                def render_rows():
+                    page = list(
+                        queryset.values(*BookRowSerializer.value_fields())[:page_size]
+                    )
+                    return renderer.render(BookRowSerializer(page, many=True).data)
+
+                if render_models() != render_rows():
+                    raise AssertionError(
+                        f"Serializers disagree at page size {page_size}."
+                    )
+
+                model_time = self.measure(render_models, repeat)
+                row_time = self.measure(render_rows, repeat)
+                self.stdout.write(
+                    f"page_size={page_size} "
+                    f"BookSerializer={model_time * 1000:.2f}ms "
+                    f"BookRowSerializer={row_time * 1000:.2f}ms "
+                    f"speedup={model_time / row_time:.2f}x"
+                )
+
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        """
+        Create `count` in-stock books in a benchmark category.
+        """
+        category = Category.objects.create(name="Serializer Benchmark")
+        Book.objects.bulk_create(
+            [
+                Book(
+                    title=f"Benchmark Book {index:07d}",
+                    author=f"Author {index % 500}",
+                    year_published=1900 + index % 120,
+                    price="19.90",
+                    stock=10,
+                    category=category,
+                )
+                for index in range(count)
+            ],
+            batch_size=1000,
+        )
+
+    def measure(self, func, repeat):
+        """
+        Return the median duration of `repeat` calls of `func`, in seconds.
+        """
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - start)
+        return statistics.median(durations)
@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from book.importers import FORMATS, import_books
+
+
+class Command(BaseCommand):
+    """
+    Import books from a CSV or JSON Lines file.
+
+    Each row holds title, author, year_published, price, stock and category,
+    where the category is given by id or by name.
+    """
+
+    help = "Import books from a CSV or JSON Lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path of the file to import.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="Format of the file. Defaults to the file extension.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of rows validated and inserted at a time.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or os.path.splitext(path)[1].lstrip(".")
+        if file_format not in FORMATS:
+            raise CommandError(
+                f"Cannot tell the format of {path}, use --format csv or --format jsonl."
+            )
+
+        with open(path, encoding="utf-8", newline="") as stream:
+            report = import_books(stream, file_format, chunk_size=options["chunk_size"])
+
+        for error in report.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(f"Created {report.created} books, rejected {report.failed}.")
+        if report.undecodable and not report.created:
+            raise CommandError(f"{path} is not valid UTF-8.")
@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-17 15:27
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_reserved(apps, schema_editor):
+    Book = apps.get_model("book", "Book")
+    CartItem = apps.get_model("cart", "CartItem")
+    db_alias = schema_editor.connection.alias
+
+    reserved = (
+        CartItem.objects.using(db_alias)
+        .values("book")
+        .annotate(total_quantity=Sum("quantity"))
+        .order_by()
+    )
+    for item in reserved:
+        Book.objects.using(db_alias).filter(pk=item["book"]).update(
+            reserved=item["total_quantity"]
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0001_initial"),
+        ("cart", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="reserved",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_reserved, migrations.RunPython.noop),
+    ]
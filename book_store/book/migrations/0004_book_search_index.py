@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-17 15:40
+
+from django.db import migrations
+
+from book.search import create_search_index, drop_search_index
+
+
+def forwards(apps, schema_editor):
+    create_search_index(schema_editor)
+
+
+def backwards(apps, schema_editor):
+    drop_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0003_book_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
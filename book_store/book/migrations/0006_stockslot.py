@@ -0,0 +1,40 @@
+# Generated by Django 5.0 on 2026-10-17 17:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0005_stockmovement"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockSlot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveSmallIntegerField()),
+                ("quantity", models.IntegerField(default=0)),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stock_slots",
+                        to="book.book",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("book", "index")},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0 on 2026-10-17 17:41
+
+from django.db import migrations, models
+
+from book.search import create_search_index
+
+
+def flag_sharded_books(apps, schema_editor):
+    Book = apps.get_model("book", "Book")
+    Book.objects.using(schema_editor.connection.alias).filter(
+        stock_slots__isnull=False
+    ).update(sharded=True)
+
+
+def restore_search_index(apps, schema_editor):
+    # Adding or removing the field rebuilds book_book on SQLite, which drops
+    # the triggers of its search index.
+    create_search_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("book", "0006_stockslot"),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search_index),
+        migrations.AddField(
+            model_name="book",
+            name="sharded",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(restore_search_index, migrations.RunPython.noop),
+        migrations.RunPython(flag_sharded_books, migrations.RunPython.noop),
+    ]
@@ -1,47 +1,291 @@
-from django.apps import apps
+import random
+
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import F, Sum, Case, When, Value, IntegerField
+from django.db import models, transaction
+from django.db.models import (
+    Count,
+    F,
+    Q,
+    Case,
+    OuterRef,
+    Subquery,
+    Sum,
+    When,
+    Value,
+    IntegerField,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from category.models import Category
+from .signals import stock_changed
+
+
+def slot_stock(book="pk", sharded="sharded"):
+    """
+    Return an expression of the copies of a book held in its stock slots.
+
+    The slots are only summed for books flagged as sharded, so the subquery
+    is not run for the rows of the other books.
+
+    Args:
+        book (str): Reference to the book's id in the outer query.
+        sharded (str): Reference to the book's `sharded` flag in the outer query.
+    """
+    slots = (
+        StockSlot.objects.filter(book=OuterRef(book))
+        .values("book")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    return Case(
+        When(
+            **{sharded: True},
+            then=Coalesce(Subquery(slots, output_field=IntegerField()), Value(0)),
+        ),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
 
 
 class BookManager(models.Manager):
+    def with_current_stock(self):
+        """
+        Retrieve a queryset of books annotated with their `current_stock`.
+
+        The `stock` column is a snapshot: checkouts are recorded as movements in
+        the stock ledger and only folded into it later. The current stock is the
+        snapshot plus the movements that have not been folded yet.
+        """
+        unfolded = (
+            StockMovement.objects.filter(book=OuterRef("pk"), folded=False)
+            .values("book")
+            .annotate(total=Sum("quantity"))
+            .values("total")
+        )
+        return self.get_queryset().annotate(
+            current_stock=F("stock")
+            + Coalesce(Subquery(unfolded, output_field=IntegerField()), Value(0))
+        )
+
     def with_effective_stock(self):
         """
         Retrieve a queryset of books with effective stock.
 
-        This method calculates the effective stock of each book by subtracting
-        the quantity of books held in all carts from the actual stock.
-        Only books with a positive effective stock are returned.
-        """
+        The effective stock of a book is its actual stock minus the quantity
+        reserved in carts, which is kept up to date in the `reserved` column
+        whenever a cart item is created or deleted, plus the copies held in its
+        stock slots, which are counted as reserved on the book row. The slots
+        are only read for the books flagged as sharded.
+        Only books with a positive effective stock are returned, annotated with
+        their `current_stock`.
 
-        CartItem = apps.get_model("cart", "CartItem")
-        total_books_in_carts = CartItem.objects.values("book").annotate(
-            total_quantity=Sum("quantity")
+        An unfolded checkout movement has also consumed a reservation, so it
+        lowers the stock and the reserved quantity alike and the difference of
+        the snapshot columns is exact without reading the ledger.
+        """
+        return (
+            self.with_current_stock()
+            .annotate(effective_stock=F("stock") - F("reserved") + slot_stock())
+            .filter(effective_stock__gt=0)
         )
-        total_books_in_carts_dict = {
-            item["book"]: item["total_quantity"] for item in total_books_in_carts
-        }
 
-        return (
-            self.get_queryset()
-            .annotate(
-                effective_stock=F("stock")
-                - Sum(
-                    Case(
-                        When(
-                            id__in=total_books_in_carts_dict.keys(),
-                            then=Value(total_books_in_carts_dict.get(F("id"))),
-                        ),
-                        default=0,
-                        output_field=IntegerField(),
-                    )
+    def adjust_reserved(self, deltas):
+        """
+        Apply reserved-quantity changes to several books in a single UPDATE.
+
+        Args:
+            deltas (dict): Mapping of book id to the signed quantity to add to
+                the book's reserved counter.
+        """
+        deltas = {book_id: delta for book_id, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            updated = self.filter(pk__in=deltas).update(
+                reserved=Case(
+                    *[
+                        When(pk=book_id, then=F("reserved") + Value(delta))
+                        for book_id, delta in deltas.items()
+                    ],
+                    default=F("reserved"),
+                    output_field=IntegerField(),
                 )
             )
-            .filter(effective_stock__gt=0)
+            flipped = self.adjust_in_stock_counts(reserved_deltas=deltas)
+        # The reserved counter is not part of the book responses, which only
+        # change when a book is listed or delisted.
+        if flipped:
+            stock_changed.send(sender=self.model, book_ids=flipped)
+        return updated
+
+    def reserve(self, book_id, quantity=1):
+        """
+        Reserve copies of a book with a single conditional UPDATE.
+
+        The reserved counter is only incremented when the unreserved stock covers
+        the requested quantity, so concurrent reservations can never oversell a
+        book and no explicit row lock is taken beforehand. When the book row has
+        no unreserved copy left, the copies are taken from the book's stock
+        slots, if it has any, without writing to the book row.
+
+        Args:
+            book_id (int): Id of the book to reserve.
+            quantity (int): Number of copies to reserve.
+
+        Returns:
+            bool: True if the copies were reserved.
+        """
+        flipped = []
+        with transaction.atomic(using=self.db, savepoint=False):
+            reserved = self.filter(
+                pk=book_id, stock__gte=F("reserved") + quantity
+            ).update(reserved=F("reserved") + quantity)
+            if reserved:
+                flipped = self.adjust_in_stock_counts(
+                    reserved_deltas={book_id: quantity}
+                )
+            else:
+                reserved = StockSlot.objects.db_manager(self.db).take(book_id, quantity)
+        if flipped:
+            stock_changed.send(sender=self.model, book_ids=flipped)
+        return bool(reserved)
+
+    def adjust_stock(self, deltas, kind):
+        """
+        Change the stock of several books in a single UPDATE and record the
+        changes in the stock ledger.
+
+        Restocks and adjustments are applied to the stock snapshots right away
+        and their movements are recorded as folded, so that only checkouts are
+        ever left in the unfolded tail of the ledger.
+
+        Args:
+            deltas (dict): Mapping of book id to the signed quantity to add to
+                the book's stock.
+            kind (str): The StockMovement kind recorded for the changes.
+        """
+        deltas = {book_id: delta for book_id, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            updated = self.filter(pk__in=deltas).update(
+                stock=Case(
+                    *[
+                        When(pk=book_id, then=F("stock") + Value(delta))
+                        for book_id, delta in deltas.items()
+                    ],
+                    default=F("stock"),
+                    output_field=IntegerField(),
+                ),
+                updated_at=timezone.now(),
+            )
+            StockMovement.objects.db_manager(self.db).bulk_create(
+                [
+                    StockMovement(
+                        book_id=book_id, kind=kind, quantity=delta, folded=True
+                    )
+                    for book_id, delta in deltas.items()
+                ]
+            )
+            self.adjust_in_stock_counts(stock_deltas=deltas)
+
+            # A reduction may leave the slots of a sharded book holding more
+            # copies than it has left, so they are split again.
+            sharded = (
+                StockSlot.objects.db_manager(self.db)
+                .filter(book_id__in=[pk for pk, delta in deltas.items() if delta < 0])
+                .values("book_id")
+                .annotate(slots=Count("pk"))
+                .values_list("book_id", "slots")
+            )
+            for book_id, slots in sharded:
+                StockSlot.objects.db_manager(self.db).split(book_id, slots)
+        stock_changed.send(sender=self.model, book_ids=list(deltas))
+        return updated
+
+    def fold_stock(self, stock_deltas, reserved_deltas):
+        """
+        Fold ledger movements into the stock and reserved snapshots of several
+        books in a single UPDATE.
+
+        Args:
+            stock_deltas (dict): Mapping of book id to the signed quantity to add
+                to the book's stock.
+            reserved_deltas (dict): Mapping of book id to the signed quantity to
+                add to the book's reserved counter.
+        """
+        if not stock_deltas and not reserved_deltas:
+            return 0
+
+        return self.filter(pk__in={*stock_deltas, *reserved_deltas}).update(
+            **{
+                name: Case(
+                    *[
+                        When(pk=book_id, then=F(name) + Value(delta))
+                        for book_id, delta in deltas.items()
+                    ],
+                    default=F(name),
+                    output_field=IntegerField(),
+                )
+                for name, deltas in (
+                    ("stock", stock_deltas),
+                    ("reserved", reserved_deltas),
+                )
+                if deltas
+            }
         )
 
+    def adjust_in_stock_counts(
+        self, stock_deltas=None, reserved_deltas=None, slot_deltas=None
+    ):
+        """
+        Update the in-stock counts of the categories after a bulk change of stock,
+        reserved or stock slot quantities.
+
+        It runs in the transaction of the change, while the changed rows are
+        still locked, and derives each book's previous availability from its
+        new values and the deltas, so the rows are read once after the change
+        instead of before and after it.
+
+        Args:
+            stock_deltas (dict): Mapping of book id to the signed change that
+                was applied to its stock.
+            reserved_deltas (dict): Mapping of book id to the signed change
+                that was applied to its reserved counter.
+            slot_deltas (dict): Mapping of book id to the signed change that
+                was applied to the copies held in its stock slots.
+
+        Returns:
+            list: Ids of the books whose availability changed.
+        """
+        stock_deltas = stock_deltas or {}
+        reserved_deltas = reserved_deltas or {}
+        slot_deltas = slot_deltas or {}
+        changes = {}
+        flipped = []
+        rows = (
+            self.filter(pk__in={*stock_deltas, *reserved_deltas, *slot_deltas})
+            .annotate(slot_stock=slot_stock())
+            .values_list("pk", "category_id", "stock", "reserved", "slot_stock")
+        )
+        for book_id, category_id, stock, reserved, slotted in rows:
+            available = stock + slotted > reserved
+            was_available = stock - stock_deltas.get(
+                book_id, 0
+            ) + slotted - slot_deltas.get(book_id, 0) > reserved - reserved_deltas.get(
+                book_id, 0
+            )
+            if available != was_available:
+                flipped.append(book_id)
+                changes[category_id] = changes.get(category_id, 0) + (
+                    1 if available else -1
+                )
+        Category.objects.db_manager(self.db).adjust_counts(in_stock_counts=changes)
+        return flipped
+
 
 class Book(models.Model):
     """
@@ -54,6 +298,8 @@ class Book(models.Model):
         price (Decimal): Price of the book.
         category (ForeignKey): Category of the book, related to Category model.
         stock (int): Stock availability of the book.
+        reserved (int): Quantity of the book currently held in carts.
+        sharded (bool): Whether part of the stock is held in stock slots.
         created_at (DateTimeField): The date and time when the book was created.
         updated_at (DateTimeField): The date and time when the book was last updated.
     """
@@ -66,26 +312,378 @@ class Book(models.Model):
         Category, on_delete=models.CASCADE, related_name="books"
     )
     stock = models.IntegerField(default=0)
+    reserved = models.IntegerField(default=0, editable=False)
+    sharded = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     objects = BookManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["title", "id"], name="book_title_id_idx"),
+            models.Index(fields=["author", "title"], name="book_author_title_idx"),
+            models.Index(fields=["category", "title"], name="book_category_title_idx"),
+            models.Index(
+                fields=["year_published", "title"], name="book_year_title_idx"
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Create an instance from a database row and remember the loaded values,
+        so that save() can tell which fields changed without re-reading the row.
+        """
+        instance = super(Book, cls).from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        """
+        Reload field values from the database and remember them as the loaded values.
+        """
+        super(Book, self).refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_loaded_values(fields)
+
+    def _remember_loaded_values(self, fields=None):
+        loaded_values = self.__dict__.setdefault("_loaded_values", {})
+        for field in self._meta.concrete_fields:
+            if fields is not None and not {field.name, field.attname} & set(fields):
+                continue
+            if field.attname in self.__dict__:
+                loaded_values[field.attname] = getattr(self, field.attname)
+
+    def get_dirty_fields(self):
+        """
+        Return the names of the fields whose value differs from the one that was
+        loaded from, or last saved to, the database.
+
+        Returns:
+            list: Names of the changed fields. Deferred fields that were never
+            loaded are not considered changed.
+        """
+        loaded_values = getattr(self, "_loaded_values", {})
+        return [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname in self.__dict__
+            and (
+                field.attname not in loaded_values
+                or loaded_values[field.attname] != getattr(self, field.attname)
+            )
+        ]
+
     def save(self, *args, **kwargs):
         """
         Save method overridden to prevent direct editing of stock after creation.
 
+        Updates only write the fields that changed since the instance was loaded,
+        and the stock guard is checked against the loaded values instead of
+        re-reading the row. A stock change made with `update_stock=True` is
+        applied as the difference from the loaded stock and recorded in the
+        stock ledger, as a restock when it is positive and as an adjustment
+        otherwise.
+
         Args:
             *args: Variable length argument list.
             **kwargs: Arbitrary keyword arguments.
         """
         update_stock = kwargs.pop("update_stock", False)
+        stock_delta = 0
+
+        if not self._state.adding:
+            dirty_fields = self.get_dirty_fields()
+            update_fields = kwargs.get("update_fields")
+
+            if "stock" in dirty_fields and (
+                update_fields is None or "stock" in update_fields
+            ):
+                if not update_stock:
+                    raise ValidationError("Stock cannot be edited directly.")
+                stock_delta = self.stock - self._get_loaded_stock(kwargs.get("using"))
 
-        if self.pk and not update_stock:
-            original = Book.objects.get(pk=self.pk)
-            if original.stock != self.stock:
-                raise ValidationError("Stock cannot be edited directly.")
+            if update_fields is None:
+                # The reserved counter is only changed through adjust_reserved(),
+                # and the stock snapshot through adjust_stock() and the folding
+                # of the ledger, so a stale instance must never write them back.
+                update_fields = [
+                    name for name in dirty_fields if name not in ("stock", "reserved")
+                ]
+                if update_fields and "updated_at" not in update_fields:
+                    update_fields.append("updated_at")
+            else:
+                update_fields = [name for name in update_fields if name != "stock"]
+            kwargs["update_fields"] = update_fields
+
+        # The category counts are moved by post_save in the same transaction,
+        # while the row written by the update is still locked.
+        with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+            super(Book, self).save(*args, **kwargs)
+            if stock_delta:
+                Book.objects.db_manager(self._state.db).adjust_stock(
+                    {self.pk: stock_delta},
+                    kind=StockMovement.RESTOCK
+                    if stock_delta > 0
+                    else StockMovement.ADJUSTMENT,
+                )
+        self._remember_loaded_values(kwargs.get("update_fields"))
+        if stock_delta:
+            self.refresh_from_db(using=self._state.db, fields=["stock"])
 
-        super(Book, self).save(*args, **kwargs)
+    def _get_loaded_stock(self, using=None):
+        loaded_values = getattr(self, "_loaded_values", {})
+        if "stock" in loaded_values:
+            return loaded_values["stock"]
+        return (
+            Book._base_manager.using(using or self._state.db)
+            .filter(pk=self.pk)
+            .values_list("stock", flat=True)
+            .get()
+        )
 
     def __str__(self):
         return self.title
+
+
+class StockMovementQuerySet(models.QuerySet):
+    def record_checkout(self, quantities):
+        """
+        Record the checkout of several books in the stock ledger with a single insert.
+
+        The book rows are not written: the movements are folded into the stock
+        snapshots later by fold(). Every checked-out quantity must have been
+        reserved in a cart, as its movement also consumes that reservation when
+        it is folded.
+
+        Args:
+            quantities (dict): Mapping of book id to the quantity checked out.
+        """
+        movements = self.bulk_create(
+            [
+                StockMovement(
+                    book_id=book_id, kind=StockMovement.CHECKOUT, quantity=-quantity
+                )
+                for book_id, quantity in quantities.items()
+                if quantity
+            ]
+        )
+        if movements:
+            stock_changed.send(sender=Book, book_ids=list(quantities))
+        return movements
+
+    def fold(self, batch_size=1000):
+        """
+        Fold a batch of unfolded movements into the snapshots of their books.
+
+        The oldest `batch_size` unfolded movements are locked, skipping those
+        locked by a concurrent fold, summed per book and applied with a single
+        UPDATE of the books before they are marked as folded, all in one
+        transaction. A checkout movement lowers both the stock and the reserved
+        counter of its book, so folding it changes neither the current stock
+        nor the availability of the book.
+
+        Args:
+            batch_size (int): The maximum number of movements folded.
+
+        Returns:
+            int: The number of movements folded.
+        """
+        with transaction.atomic(using=self.db):
+            rows = list(
+                self.select_for_update(skip_locked=True)
+                .filter(folded=False)
+                .order_by("pk")
+                .values_list("pk", "book_id", "kind", "quantity")[:batch_size]
+            )
+            if not rows:
+                return 0
+
+            stock_deltas = {}
+            reserved_deltas = {}
+            for _, book_id, kind, quantity in rows:
+                stock_deltas[book_id] = stock_deltas.get(book_id, 0) + quantity
+                if kind == StockMovement.CHECKOUT:
+                    reserved_deltas[book_id] = (
+                        reserved_deltas.get(book_id, 0) + quantity
+                    )
+
+            Book.objects.db_manager(self.db).fold_stock(stock_deltas, reserved_deltas)
+            self.filter(pk__in=[pk for pk, _, _, _ in rows]).update(folded=True)
+        return len(rows)
+
+
+class StockMovement(models.Model):
+    """
+    Represents a change of the stock of a book in the append-only stock ledger.
+
+    Checkouts are recorded as unfolded movements with a cheap insert instead of
+    updating the book row, and are folded into the book's stock snapshot by a
+    periodic task. Restocks and adjustments are folded as soon as they are
+    recorded, so that the difference between the stock and reserved snapshots
+    of a book is always its exact unreserved stock.
+
+    Attributes:
+        book (ForeignKey): The book whose stock changed.
+        kind (str): Why the stock changed: restock, checkout or adjustment.
+        quantity (int): The signed change of the stock.
+        folded (bool): Whether the change is included in the book's stock snapshot.
+        created_at (DateTimeField): The date and time when the change was recorded.
+    """
+
+    RESTOCK = "restock"
+    CHECKOUT = "checkout"
+    ADJUSTMENT = "adjustment"
+    KIND_CHOICES = [
+        (RESTOCK, "Restock"),
+        (CHECKOUT, "Checkout"),
+        (ADJUSTMENT, "Adjustment"),
+    ]
+
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="stock_movements"
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    folded = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    objects = StockMovementQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["book"],
+                condition=Q(folded=False),
+                name="stockmovement_unfolded_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.quantity} for book {self.book_id}"
+
+
+class StockSlotQuerySet(models.QuerySet):
+    def split(self, book_id, slots):
+        """
+        Spread the unreserved copies of a book evenly over `slots` stock slots.
+
+        The copies already held in slots are gathered first, so a sharded book
+        can be split again into another number of slots, and a book is
+        unsharded by splitting it into 0 slots. The copies moved into the slots
+        are counted as reserved on the book row, so neither the stock nor the
+        availability of the book changes.
+
+        Args:
+            book_id (int): Id of the book to shard.
+            slots (int): Number of slots to split the copies over.
+
+        Returns:
+            int: The number of copies held in the slots.
+        """
+        with transaction.atomic(using=self.db):
+            stock, reserved = (
+                Book.objects.db_manager(self.db)
+                .select_for_update()
+                .filter(pk=book_id)
+                .values_list("stock", "reserved")
+                .get()
+            )
+            gathered = sum(
+                self.select_for_update()
+                .filter(book_id=book_id)
+                .values_list("quantity", flat=True)
+            )
+            self.filter(book_id=book_id).delete()
+
+            slotted = max(stock - reserved + gathered, 0) if slots else 0
+            quotient, remainder = divmod(slotted, slots) if slots else (0, 0)
+            self.bulk_create(
+                [
+                    StockSlot(
+                        book_id=book_id,
+                        index=index,
+                        quantity=quotient + (index < remainder),
+                    )
+                    for index in range(slots)
+                ]
+            )
+            Book.objects.db_manager(self.db).filter(pk=book_id).update(
+                reserved=F("reserved") - gathered + slotted, sharded=bool(slots)
+            )
+        return slotted
+
+    def take(self, book_id, quantity=1):
+        """
+        Take copies of a sharded book from one of its stock slots.
+
+        A random slot with enough copies is decremented with a conditional
+        UPDATE, and the other slots are tried in random order when a concurrent
+        take got there first. Concurrent takes therefore spread over the slots
+        instead of waiting on one row, and the book row is not written.
+
+        The book can only sell out when a slot is emptied. The take that
+        empties a slot locks the book row before recounting the slots, so the
+        recounts of concurrent takes run one after the other and exactly one
+        of them sees the last copies go.
+
+        Args:
+            book_id (int): Id of the book.
+            quantity (int): Number of copies to take.
+
+        Returns:
+            bool: True if the copies were taken.
+        """
+        taken = False
+        flipped = []
+        with transaction.atomic(using=self.db, savepoint=False):
+            candidates = list(
+                self.filter(book_id=book_id, quantity__gte=quantity).values_list(
+                    "pk", flat=True
+                )
+            )
+            random.shuffle(candidates)
+            for pk in candidates:
+                taken = self.filter(pk=pk, quantity__gte=quantity).update(
+                    quantity=F("quantity") - quantity
+                )
+                if not taken:
+                    continue
+                if not self.filter(pk=pk, quantity__gt=0).exists():
+                    books = Book.objects.db_manager(self.db)
+                    books.select_for_update().filter(pk=book_id).values_list("pk").get()
+                    flipped = books.adjust_in_stock_counts(
+                        slot_deltas={book_id: -quantity}
+                    )
+                break
+        if flipped:
+            stock_changed.send(sender=Book, book_ids=flipped)
+        return bool(taken)
+
+
+class StockSlot(models.Model):
+    """
+    Represents one of the counters the unreserved stock of a book is split over.
+
+    Books are sharded on demand, typically before a promotion, so that
+    concurrent reservations of the same title update different rows. The
+    copies held in slots are counted as reserved on the book row: the stock of
+    a book is unchanged by sharding, and its unreserved stock is what is left
+    on the row plus the copies in its slots. Released reservations return to
+    the book row, whose copies are reserved before the slots' ones.
+
+    Attributes:
+        book (ForeignKey): The sharded book.
+        index (int): Position of the slot among the book's slots.
+        quantity (int): Number of unreserved copies held in the slot.
+    """
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="stock_slots")
+    index = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+    objects = StockSlotQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ("book", "index")
+
+    def __str__(self):
+        return f"Slot {self.index} of book {self.book_id}: {self.quantity}"
@@ -0,0 +1,150 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    PageNumberPagination,
+    _positive_int,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    """
+    Custom pagination class to define page size and limits for API responses.
+    """
+
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class TitleCursorPagination(BasePagination):
+    """
+    Keyset pagination over the (title, id) ordering of the book list.
+
+    Each page is fetched with a range condition on the last seen (title, id)
+    pair instead of an OFFSET, and no COUNT query is run, so deep pages cost the
+    same as the first one. The `next` and `previous` links carry opaque cursors.
+    """
+
+    page_size = StandardResultsSetPagination.page_size
+    page_size_query_param = StandardResultsSetPagination.page_size_query_param
+    max_page_size = StandardResultsSetPagination.max_page_size
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Return the page of results that follows (or precedes) the request's cursor.
+        """
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        if position is not None:
+            title, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(title__lt=title) | Q(title=title, id__lt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(title__gt=title) | Q(title=title, id__gt=pk)
+                )
+        ordering = ("-title", "-id") if reverse else ("title", "id")
+
+        results = list(queryset.order_by(*ordering)[: page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        """
+        Return the page size requested by the client, capped at `max_page_size`.
+        """
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_position(self, book):
+        """
+        Return the (title, id) pair that identifies a book, or a book row, in the ordering.
+        """
+        if isinstance(book, dict):
+            return book["title"], book["id"]
+        return book.title, book.pk
+
+    def encode_cursor(self, position, reverse):
+        """
+        Return the URL of the page that starts after (or before) the given position.
+        """
+        title, pk = position
+        payload = json.dumps([title, pk, reverse], separators=(",", ":"))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        """
+        Return the (title, id) position and direction encoded in the request's cursor.
+
+        Raises:
+            NotFound: If the cursor cannot be decoded.
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+
+        try:
+            payload = base64.urlsafe_b64decode(cursor.encode())
+            title, pk, reverse = json.loads(payload)
+            if not isinstance(title, str) or not isinstance(pk, int):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return (title, pk), bool(reverse)
@@ -0,0 +1,159 @@
+"""
+Full-text search over book titles and authors.
+
+On SQLite the text index is an external-content FTS5 table, `book_book_fts`,
+kept in sync with `book_book` by triggers. On PostgreSQL it is a generated
+`search_vector` tsvector column with a GIN index. Because both are maintained
+by the database itself, every write path (saves, queryset updates, bulk
+inserts) keeps the index up to date.
+
+Migrations that rebuild the `book_book` table on SQLite drop its triggers and
+must call create_search_index() again.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS book_book_fts USING fts5(
+        title, author, content='book_book', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_book_fts_insert AFTER INSERT ON book_book
+    BEGIN
+        INSERT INTO book_book_fts(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_book_fts_delete AFTER DELETE ON book_book
+    BEGIN
+        INSERT INTO book_book_fts(book_book_fts, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_book_fts_update
+    AFTER UPDATE OF title, author ON book_book
+    BEGIN
+        INSERT INTO book_book_fts(book_book_fts, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO book_book_fts(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+    "INSERT INTO book_book_fts(book_book_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS book_book_fts_insert",
+    "DROP TRIGGER IF EXISTS book_book_fts_delete",
+    "DROP TRIGGER IF EXISTS book_book_fts_update",
+    "DROP TABLE IF EXISTS book_book_fts",
+]
+
+POSTGRESQL_CREATE = [
+    """
+    ALTER TABLE book_book ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(author, ''))
+    ) STORED
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS book_book_search_vector_idx
+    ON book_book USING GIN (search_vector)
+    """,
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS book_book_search_vector_idx",
+    "ALTER TABLE book_book DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def create_search_index(schema_editor):
+    """
+    Create the text index of the database behind `schema_editor`, if it has one.
+    """
+    statements = {"sqlite": SQLITE_CREATE, "postgresql": POSTGRESQL_CREATE}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(schema_editor):
+    """
+    Drop the text index of the database behind `schema_editor`, if it has one.
+    """
+    statements = {"sqlite": SQLITE_DROP, "postgresql": POSTGRESQL_DROP}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def search_books(queryset, query):
+    """
+    Filter a book queryset down to the books matching a search query.
+
+    Every word of the query must match the start of a word in the title or the
+    author. The result is annotated with `search_rank` and ordered from the
+    best match to the worst.
+
+    Args:
+        queryset (QuerySet): The books to search.
+        query (str): The text typed by the user.
+
+    Returns:
+        QuerySet: The matching books, best matches first.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        return (
+            queryset.filter(
+                id__in=RawSQL(
+                    "SELECT rowid FROM book_book_fts WHERE book_book_fts MATCH %s",
+                    (match,),
+                )
+            )
+            .annotate(
+                search_rank=RawSQL(
+                    "SELECT rank FROM book_book_fts "
+                    "WHERE book_book_fts MATCH %s AND rowid = book_book.id",
+                    (match,),
+                    output_field=FloatField(),
+                )
+            )
+            .order_by("search_rank", "id")
+        )
+
+    if vendor == "postgresql":
+        tsquery = " & ".join(f"{term}:*" for term in terms)
+        return (
+            queryset.filter(
+                RawSQL(
+                    "book_book.search_vector @@ to_tsquery('simple', %s)",
+                    (tsquery,),
+                    output_field=BooleanField(),
+                )
+            )
+            .annotate(
+                search_rank=RawSQL(
+                    "ts_rank(book_book.search_vector, to_tsquery('simple', %s))",
+                    (tsquery,),
+                    output_field=FloatField(),
+                )
+            )
+            .order_by("-search_rank", "id")
+        )
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(author__icontains=term)
+    return queryset.filter(condition).order_by("title", "id")
@@ -1,6 +1,8 @@
 import datetime
 
-from rest_framework import serializers
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 
 from .models import Book
 from category.models import Category
@@ -12,11 +14,19 @@ class BookSerializer(serializers.ModelSerializer):
 
     Provides validation for title, author, year_published, price, and stock.
     Additionally, it validates that the specified book category exists.
+    Books annotated with their `current_stock` are represented with it as
+    their stock.
     """
 
     class Meta:
         model = Book
-        fields = "__all__"
+        exclude = ("reserved", "sharded")
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        if hasattr(instance, "current_stock"):
+            representation["stock"] = instance.current_stock
+        return representation
 
     def validate_title(self, value):
         """Check that the title is not empty."""
@@ -49,6 +59,30 @@ class BookSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Stock cannot be negative.")
         return value
 
+    def update(self, instance, validated_data):
+        """
+        Update a book, treating a stock equal to its current stock as unchanged.
+
+        Books are represented with their current stock, which includes the
+        checkouts not folded into the stock snapshot yet, so a client sending
+        a book back as it read it does not edit the stock. Any other stock is
+        rejected, as stock changes go through the stock ledger.
+        """
+        if "stock" in validated_data:
+            current_stock = getattr(instance, "current_stock", None)
+            if current_stock is None:
+                current_stock = (
+                    Book.objects.with_current_stock()
+                    .filter(pk=instance.pk)
+                    .values_list("current_stock", flat=True)
+                    .get()
+                )
+            if validated_data.pop("stock") != current_stock:
+                raise serializers.ValidationError(
+                    {"stock": "Stock cannot be edited directly."}
+                )
+        return super().update(instance, validated_data)
+
     def validate(self, data):
         """
         Perform object-level validation on the Book instance.
@@ -63,3 +97,83 @@ class BookSerializer(serializers.ModelSerializer):
                 {"category": "This category does not exist."}
             )
         return data
+
+
+class BookRowSerializer(serializers.BaseSerializer):
+    """
+    Read-only serializer for book rows fetched with `values(*value_fields())`
+    from a queryset annotated with `current_stock`.
+
+    It produces exactly the same representation as BookSerializer, but works on
+    plain dicts and only formats the values that need it (decimals and
+    datetimes), resolving the current time zone once per serializer instead of
+    once per value. Large list pages therefore skip building model instances
+    and the generic ModelSerializer field machinery.
+    """
+
+    # Row keys read for the fields whose value is not the column of their name.
+    sources = {"stock": "current_stock"}
+
+    @staticmethod
+    def field_names():
+        """
+        Return the names of the fields of the representation, in order.
+        """
+        return list(BookSerializer().fields)
+
+    @classmethod
+    def value_fields(cls):
+        """
+        Return the field names to pass to `values()` for this serializer.
+        """
+        return [cls.sources.get(name, name) for name in cls.field_names()]
+
+    def get_formatters(self):
+        """
+        Return (name, source, formatter) tuples for the fields of BookSerializer,
+        in order.
+
+        The formatter is None for fields whose database value is already its
+        representation.
+        """
+        formatters = getattr(self, "_formatters", None)
+        if formatters is None:
+            formatters = self._formatters = [
+                (name, self.sources.get(name, name), self.get_formatter(field))
+                for name, field in BookSerializer().fields.items()
+            ]
+        return formatters
+
+    def get_formatter(self, field):
+        if isinstance(field, serializers.RelatedField) or type(field) in (
+            serializers.CharField,
+            serializers.IntegerField,
+        ):
+            return None
+
+        if (
+            isinstance(field, serializers.DateTimeField)
+            and getattr(field, "format", api_settings.DATETIME_FORMAT) == ISO_8601
+        ):
+            field_timezone = getattr(field, "timezone", field.default_timezone())
+            if field_timezone is not None:
+
+                def format_datetime(value):
+                    if timezone.is_naive(value):
+                        return field.to_representation(value)
+                    value = value.astimezone(field_timezone).isoformat()
+                    if value.endswith("+00:00"):
+                        value = value[:-6] + "Z"
+                    return value
+
+                return format_datetime
+
+        return field.to_representation
+
+    def to_representation(self, row):
+        return {
+            name: row[source]
+            if formatter is None or row[source] is None
+            else formatter(row[source])
+            for name, source, formatter in self.get_formatters()
+        }
@@ -0,0 +1,107 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from book_store.cache import invalidate
+from category.models import Category
+
+# Sent by BookManager when the current stock or the availability of books is
+# changed with a queryset update, which does not send post_save. Reservations
+# that leave a book available are not reported, as they do not change its
+# responses.
+stock_changed = Signal()
+
+
+@receiver(post_save, sender="book.Book")
+@receiver(post_delete, sender="book.Book")
+@receiver(stock_changed)
+def invalidate_book_responses(sender, **kwargs):
+    """
+    Invalidate the cached book responses when a book or its availability changes.
+    """
+    invalidate("books")
+
+
+def get_category_counts(book, values):
+    """
+    Return the category id and availability of a book for the given field values.
+    """
+    category_id = values.get("category_id", book.category_id)
+    available = values.get("stock", book.stock) > values.get("reserved", book.reserved)
+    return category_id, available
+
+
+def adjust_category_counts(before, after):
+    """
+    Move a book's contribution to the category counts from `before` to `after`.
+
+    Args:
+        before (tuple): The (category id, available) pair the book was counted
+            with, or None if it was not counted.
+        after (tuple): The (category id, available) pair to count it with, or
+            None if it should no longer be counted.
+    """
+    book_counts = {}
+    in_stock_counts = {}
+    for counts, sign in ((before, -1), (after, 1)):
+        if counts is not None:
+            category_id, available = counts
+            book_counts[category_id] = book_counts.get(category_id, 0) + sign
+            in_stock_counts[category_id] = (
+                in_stock_counts.get(category_id, 0) + sign * available
+            )
+    Category.objects.adjust_counts(book_counts, in_stock_counts)
+
+
+@receiver(post_save, sender="book.Book")
+def update_category_counts_on_save(
+    sender, instance, created, update_fields, using, **kwargs
+):
+    """
+    Count a created book in its category, and move an updated book between the
+    counts when its category changed.
+
+    save() never writes the stock and reserved counters of an existing book,
+    so an update cannot change its availability. The availability it is moved
+    with is read from the row inside the transaction of the save, which holds
+    the row lock, rather than taken from the values the instance was loaded
+    with, which concurrent reservations may have made stale.
+    """
+    if created:
+        adjust_category_counts(None, get_category_counts(instance, {}))
+        return
+
+    loaded_values = getattr(instance, "_loaded_values", {})
+    category_id = loaded_values.get("category_id", instance.category_id)
+    if category_id == instance.category_id or (
+        update_fields is not None and "category" not in update_fields
+    ):
+        return
+
+    available = (
+        sender.objects.db_manager(using)
+        .with_effective_stock()
+        .filter(pk=instance.pk)
+        .exists()
+    )
+    adjust_category_counts((category_id, available), (instance.category_id, available))
+
+
+@receiver(pre_delete, sender="book.Book")
+def update_category_counts_on_delete(sender, instance, using, **kwargs):
+    """
+    Remove a deleted book from the counts of its category.
+
+    It runs before the row is deleted, in the transaction of the deletion, so
+    the availability is read from the row, including the copies held in its
+    stock slots, rather than taken from the values the instance was loaded
+    with.
+    """
+    loaded_values = getattr(instance, "_loaded_values", {})
+    category_id = loaded_values.get("category_id", instance.category_id)
+    available = (
+        sender.objects.db_manager(using)
+        .with_effective_stock()
+        .filter(pk=instance.pk)
+        .exists()
+    )
+    adjust_category_counts((category_id, available), None)
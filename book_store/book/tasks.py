@@ -0,0 +1,39 @@
+import logging
+from celery import shared_task
+
+from .models import StockMovement
+from book_store.metrics import STOCK_MOVEMENTS_FOLDED
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def fold_stock_movements(batch_size=1000):
+    """
+    Periodic task to fold every unfolded stock movement into the stock of its book.
+
+    Movements are folded in batches of at most `batch_size`, each in its own
+    transaction, so the book rows are only written once per batch and a large
+    backlog never holds locks for long.
+
+    Args:
+    batch_size (int): The maximum number of movements folded per batch.
+
+    Returns:
+    int: The number of movements folded.
+    """
+    folded = 0
+    while True:
+        batch = StockMovement.objects.fold(batch_size=batch_size)
+        folded += batch
+        if batch < batch_size:
+            break
+
+    STOCK_MOVEMENTS_FOLDED.inc(folded)
+    logger.info(
+        "Folded %s stock movements.",
+        folded,
+        extra={"event": "stock.movements_folded", "folded": folded},
+    )
+    return folded
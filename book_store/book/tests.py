@@ -1,10 +1,36 @@
+import io
+import json
+import logging
+import re
+from unittest.mock import patch
+
 import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.http import QueryDict
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
+from prometheus_client import REGISTRY
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from .models import Book
+from .exporters import export_books
+from .importers import import_books
+from .models import Book, StockMovement, StockSlot
+from .serializers import BookRowSerializer, BookSerializer
+from .tasks import fold_stock_movements
+from .views import BookFilter
+from book_store.cache import VERSION_KEY
+from book_store.testing import QueryBudgetExceeded, capture_queries
+from cart.models import Cart, CartItem
 from category.models import Category
 
 User = get_user_model()
@@ -30,16 +56,18 @@ class TestBookViewSet:
             price=19.99,
         )
 
-    def test_list_books(self):
+    def test_list_books(self, query_budget):
         url = reverse("book-list")
-        response = self.client.get(url)
+        with query_budget(2):
+            response = self.client.get(url)
         assert response.status_code == status.HTTP_200_OK
 
         assert len(response.data["results"]) == 1
 
-    def test_filter_books_by_author(self):
+    def test_filter_books_by_author(self, query_budget):
         url = f"{reverse('book-list')}?author={self.book.author}"
-        response = self.client.get(url)
+        with query_budget(2):
+            response = self.client.get(url)
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data["results"]) == 1
         assert response.data["results"][0]["author"] == self.book.author
@@ -91,6 +119,27 @@ class TestBookViewSet:
         self.book.refresh_from_db()
         assert self.book.title == "Updated Book"
 
+    def test_book_round_trip_with_pending_checkout(self):
+        StockMovement.objects.create(
+            book=self.book, kind=StockMovement.CHECKOUT, quantity=-1
+        )
+        Book.objects.filter(pk=self.book.pk).update(reserved=1)
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("book-detail", kwargs={"pk": self.book.id})
+
+        data = self.client.get(url).data
+        assert data["stock"] == self.book.stock - 1
+        data["title"] = "Updated Book"
+        response = self.client.put(url, data, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        self.book.refresh_from_db()
+        assert self.book.title == "Updated Book"
+
+        data["stock"] += 5
+        response = self.client.put(url, data, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "stock" in response.data
+
     def test_delete_book_unauthorized(self):
         assert Book.objects.filter(pk=self.book.id).exists()
 
@@ -123,3 +172,852 @@ class TestBookViewSet:
         book.stock = 15
         with pytest.raises(ValidationError):
             book.save()
+
+    def test_reserved_book_is_not_listed(self):
+        cart = Cart.objects.create(user=self.user)
+        cart_item = CartItem.objects.create(cart=cart, book=self.book, quantity=10)
+        self.book.refresh_from_db()
+        assert self.book.reserved == 10
+
+        response = self.client.get(reverse("book-list"))
+        assert len(response.data["results"]) == 0
+
+        cart_item.delete()
+        self.book.refresh_from_db()
+        assert self.book.reserved == 0
+
+        response = self.client.get(reverse("book-list"))
+        assert len(response.data["results"]) == 1
+
+    def test_save_does_not_overwrite_reserved(self):
+        stale_book = Book.objects.get(pk=self.book.pk)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, book=self.book, quantity=3)
+
+        stale_book.title = "Renamed Book"
+        stale_book.save()
+
+        self.book.refresh_from_db()
+        assert self.book.title == "Renamed Book"
+        assert self.book.reserved == 3
+
+    def test_save_writes_only_changed_fields(self):
+        book = Book.objects.get(pk=self.book.pk)
+        book.title = "Changed Title"
+
+        with CaptureQueriesContext(connection) as context:
+            book.save()
+
+        assert len(context.captured_queries) == 1
+        sql = context.captured_queries[0]["sql"]
+        assert sql.startswith("UPDATE")
+        assert '"title"' in sql
+        assert '"stock"' not in sql
+        assert '"author"' not in sql
+
+    def test_save_without_changes_does_not_write(self):
+        book = Book.objects.get(pk=self.book.pk)
+
+        with CaptureQueriesContext(connection) as context:
+            book.save()
+
+        assert len(context.captured_queries) == 0
+
+    def test_stock_can_be_updated_explicitly(self):
+        book = Book.objects.get(pk=self.book.pk)
+        book.stock = 4
+        book.save(update_stock=True)
+
+        book.refresh_from_db()
+        assert book.stock == 4
+        assert book.get_dirty_fields() == []
+
+    def test_list_books_records_metrics(self):
+        labels = {"view": "book-list", "method": "GET", "status": "200"}
+
+        def sample(name, labels):
+            return REGISTRY.get_sample_value(name, labels) or 0
+
+        requests = sample("bookstore_request_duration_seconds_count", labels)
+        queries = sample("bookstore_request_db_queries_sum", {"view": "book-list"})
+
+        assert self.client.get(reverse("book-list")).status_code == status.HTTP_200_OK
+
+        assert (
+            sample("bookstore_request_duration_seconds_count", labels) == requests + 1
+        )
+        assert (
+            sample("bookstore_request_db_queries_sum", {"view": "book-list"}) > queries
+        )
+
+        response = self.client.get(reverse("metrics"))
+        assert response.status_code == status.HTTP_200_OK
+        content = response.content.decode()
+        assert (
+            'bookstore_request_duration_seconds_count{method="GET",status="200",view="book-list"}'
+            in content
+        )
+        assert "bookstore_expired_cart_items_pending 0.0" in content
+
+    @pytest.mark.parametrize("view", ["book-list", "book-async-list"])
+    def test_async_requests_record_query_metrics(self, view):
+        def sample(name):
+            return REGISTRY.get_sample_value(name, {"view": view}) or 0
+
+        requests = sample("bookstore_request_db_queries_count")
+        queries = sample("bookstore_request_db_queries_sum")
+
+        response = async_to_sync(AsyncClient().get)(reverse(view))
+        assert response.status_code == status.HTTP_200_OK
+
+        assert sample("bookstore_request_db_queries_count") == requests + 1
+        assert sample("bookstore_request_db_queries_sum") > queries
+        assert sample("bookstore_request_db_query_duration_seconds_count") > 0
+
+    def test_cursor_pagination_walks_the_catalog(self):
+        for index in range(4):
+            Book.objects.create(
+                title="Same Title" if index % 2 else f"Book {index}",
+                author="Author",
+                year_published=2021,
+                category=self.category,
+                stock=1,
+                price=9.99,
+            )
+        expected = list(
+            Book.objects.order_by("title", "id").values_list("id", flat=True)
+        )
+
+        seen = []
+        url = f"{reverse('book-list')}?pagination=cursor&page_size=2"
+        while url:
+            response = self.client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert "count" not in response.data
+            seen.extend(book["id"] for book in response.data["results"])
+            last_page, url = response.data, response.data["next"]
+        assert seen == expected
+
+        previous = self.client.get(last_page["previous"])
+        assert [book["id"] for book in previous.data["results"]] == expected[2:4]
+
+    def test_cursor_pagination_rejects_invalid_cursor(self):
+        response = self.client.get(f"{reverse('book-list')}?cursor=not-a-cursor")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_list_books_is_cached(self):
+        url = reverse("book-list")
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.has_header("ETag")
+        assert response.has_header("Last-Modified")
+
+        with CaptureQueriesContext(connection) as context:
+            cached = self.client.get(url)
+        assert len(context.captured_queries) == 0
+        assert cached.data == response.data
+        assert cached["ETag"] == response["ETag"]
+
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_if_modified_since_is_compared_with_the_exact_version(self):
+        url = reverse("book-detail", kwargs={"pk": self.book.id})
+        version_key = VERSION_KEY.format(namespace="books")
+        cache.set(version_key, 1000.2, timeout=None)
+        response = self.client.get(url)
+        assert response["Last-Modified"] == http_date(1000)
+
+        # A write in the same second as the Last-Modified the client holds.
+        self.book.title = "Renamed Book"
+        self.book.save()
+        cache.set(version_key, 1000.7, timeout=None)
+        updated = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        assert updated.status_code == status.HTTP_200_OK
+        assert updated.data["title"] == "Renamed Book"
+
+        not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(1001))
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_cached_book_is_invalidated_on_write(self):
+        url = reverse("book-detail", kwargs={"pk": self.book.id})
+        response = self.client.get(url)
+        assert response.data["title"] == "Test Book"
+
+        self.book.title = "Renamed Book"
+        self.book.save()
+
+        updated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        assert updated.status_code == status.HTTP_200_OK
+        assert updated.data["title"] == "Renamed Book"
+
+    def test_cached_list_is_invalidated_when_book_is_reserved(self):
+        url = reverse("book-list")
+        assert len(self.client.get(url).data["results"]) == 1
+
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, book=self.book, quantity=10)
+
+        assert len(self.client.get(url).data["results"]) == 0
+
+    def test_cached_list_is_kept_when_book_stays_available(self):
+        url = reverse("book-list")
+        self.client.get(url)
+
+        cart = Cart.objects.create(user=self.user)
+        item = CartItem.objects.create(cart=cart, book=self.book, quantity=1)
+        assert Book.objects.reserve(self.book.pk, 2)
+        item.delete()
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        assert len(context.captured_queries) == 0
+
+
+@pytest.mark.django_db
+class TestAsyncBookView:
+    def setup_method(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Fiction")
+        self.other_category = Category.objects.create(name="Poetry")
+        for index in range(5):
+            Book.objects.create(
+                title=f"Book {index}",
+                author=f"Author {index % 2}",
+                year_published=2021,
+                category=self.category if index % 2 else self.other_category,
+                stock=3,
+                price=9.99,
+            )
+
+    @pytest.mark.parametrize(
+        "query",
+        ["", "?page_size=2&page=2", "?author=Author 1", "?categories={category}"],
+    )
+    def test_list_matches_viewset(self, query):
+        query = query.format(category=self.category.id)
+        response = self.client.get(f"{reverse('book-async-list')}{query}")
+        expected = self.client.get(f"{reverse('book-list')}{query}")
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["count"] == expected.data["count"]
+        assert data["results"] == json.loads(
+            JSONRenderer().render(expected.data["results"])
+        )
+        assert (data["next"] is None) == (expected.data["next"] is None)
+        assert (data["previous"] is None) == (expected.data["previous"] is None)
+
+    def test_list_rejects_invalid_filter_and_page(self):
+        response = self.client.get(f"{reverse('book-async-list')}?categories=999")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "categories" in response.json()
+
+        response = self.client.get(f"{reverse('book-async-list')}?page=9")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_retrieve(self):
+        book = Book.objects.order_by("id").first()
+        response = self.client.get(reverse("book-async-detail", kwargs={"pk": book.id}))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == json.loads(
+            JSONRenderer().render(BookSerializer(book).data)
+        )
+
+        Book.objects.filter(pk=book.pk).update(stock=0)
+        response = self.client.get(reverse("book-async-detail", kwargs={"pk": book.id}))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_query_budget_reports_repeated_queries(query_budget):
+    category = Category.objects.create(name="Fiction")
+    for index in range(3):
+        Book.objects.create(
+            title=f"Book {index}",
+            author="Author",
+            year_published=2021,
+            category=category,
+            stock=1,
+            price=9.99,
+        )
+
+    with pytest.raises(QueryBudgetExceeded) as error:
+        with query_budget(2):
+            [book.category.name for book in Book.objects.all()]
+
+    report = str(error.value)
+    assert report.startswith("4 queries executed, the budget is 2:")
+    assert re.search(
+        r"3 x SELECT .* FROM \"category_category\" WHERE .* = \? LIMIT \?", report
+    )
+
+    with query_budget(1, per_item=1, items=3):
+        [book.category.name for book in Book.objects.all()]
+
+
+@pytest.mark.django_db
+def test_row_serializer_matches_model_serializer():
+    category = Category.objects.create(name="Poetry")
+    for price in ["12.50", "7", "1234.99"]:
+        Book.objects.create(
+            title=f"Poems for {price}",
+            author="Poet",
+            year_published=1999,
+            category=category,
+            stock=3,
+            price=price,
+        )
+    queryset = Book.objects.with_current_stock().order_by("id")
+    renderer = JSONRenderer()
+
+    expected = renderer.render(BookSerializer(queryset, many=True).data)
+    rows = queryset.values(*BookRowSerializer.value_fields())
+    assert renderer.render(BookRowSerializer(rows, many=True).data) == expected
+
+
+@pytest.mark.django_db
+def test_benchmark_serializers_command():
+    stdout = io.StringIO()
+    call_command("benchmark_serializers", page_sizes=[10], repeat=1, stdout=stdout)
+    assert "page_size=10" in stdout.getvalue()
+
+
+@pytest.mark.django_db
+@pytest.mark.skipif(
+    connection.vendor != "sqlite", reason="Query plans are checked on SQLite."
+)
+def test_book_filters_use_indexes():
+    categories = Category.objects.bulk_create(
+        [Category(name=f"Category {index}") for index in range(20)]
+    )
+    Book.objects.bulk_create(
+        [
+            Book(
+                title=f"Title {index % 1000}",
+                author=f"Author {index % 300}",
+                year_published=1900 + index % 120,
+                price=9.99,
+                stock=index % 3,
+                category=categories[index % 20],
+            )
+            for index in range(5000)
+        ]
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    filters = [
+        "",
+        "title=Title 1",
+        "author=Author 1",
+        "year_published=1950",
+        f"categories={categories[0].id}",
+        f"categories={categories[0].id}&categories={categories[1].id}",
+        "author=Author 1&year_published=1950",
+    ]
+    for query in filters:
+        queryset = BookFilter(
+            QueryDict(query),
+            queryset=Book.objects.with_effective_stock().order_by("title", "id"),
+        ).qs
+        plan = queryset.explain()
+        assert not re.search(r"SCAN book_book(?! USING)", plan), (query, plan)
+
+
+@pytest.mark.django_db
+class TestBookSearch:
+    def setup_method(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Fantasy")
+        for title, author, stock in [
+            ("The Hobbit", "J. R. R. Tolkien", 5),
+            ("The Fellowship of the Ring", "J. R. R. Tolkien", 5),
+            ("Hobbit Companion", "David Day", 5),
+            ("The Silmarillion", "J. R. R. Tolkien", 0),
+        ]:
+            Book.objects.create(
+                title=title,
+                author=author,
+                year_published=1977,
+                category=self.category,
+                stock=stock,
+                price=12.50,
+            )
+
+    @pytest.fixture(autouse=True)
+    def use_query_budget(self, query_budget):
+        self.query_budget = query_budget
+
+    def search(self, query):
+        with self.query_budget(2):
+            response = self.client.get(reverse("book-search"), {"q": query})
+        assert response.status_code == status.HTTP_200_OK
+        return [book["title"] for book in response.data["results"]]
+
+    def test_search_matches_title_prefix(self):
+        assert set(self.search("hobb")) == {"The Hobbit", "Hobbit Companion"}
+
+    def test_search_matches_author_and_skips_out_of_stock(self):
+        assert set(self.search("tolkien")) == {
+            "The Hobbit",
+            "The Fellowship of the Ring",
+        }
+
+    def test_search_requires_all_terms(self):
+        assert self.search("hobbit tolkien") == ["The Hobbit"]
+
+    def test_search_index_follows_book_writes(self):
+        book = Book.objects.get(title="Hobbit Companion")
+        book.title = "Middle-earth Companion"
+        book.save()
+        Book.objects.filter(title="The Hobbit").delete()
+
+        assert self.search("hobbit") == []
+        assert self.search("middle earth") == ["Middle-earth Companion"]
+
+    def test_search_without_query(self):
+        response = self.client.get(reverse("book-search"))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestBookImport:
+    def setup_method(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(
+            email="admin@example.com", password="admin"
+        )
+        self.fiction = Category.objects.create(name="Fiction")
+        self.poetry = Category.objects.create(name="Poetry")
+
+    def test_import_csv_reports_invalid_rows(self):
+        stream = io.StringIO(
+            "title,author,year_published,price,stock,category\n"
+            "Book A,Author A,2001,10.00,3,Fiction\n"
+            f"Book B,Author B,2002,11.50,4,{self.poetry.id}\n"
+            "Book C,Author C,2003,-1,4,Fiction\n"
+            "Book D,Author D,2004,9.99,1,Unknown\n"
+        )
+
+        report = import_books(stream, "csv", chunk_size=2)
+
+        assert report.created == 2
+        assert [error["row"] for error in report.errors] == [3, 4]
+        assert "price" in report.errors[0]["errors"]
+        assert "category" in report.errors[1]["errors"]
+        assert Book.objects.get(title="Book B").category == self.poetry
+        self.fiction.refresh_from_db()
+        assert (self.fiction.book_count, self.fiction.in_stock_count) == (1, 1)
+
+    def test_import_queries_do_not_depend_on_chunk_size(self):
+        def rows(count):
+            return io.StringIO(
+                "".join(
+                    json.dumps(
+                        {
+                            "title": f"Book {index}",
+                            "author": "Author",
+                            "year_published": 2000,
+                            "price": "5.00",
+                            "stock": 1,
+                            "category": "Fiction",
+                        }
+                    )
+                    + "\n"
+                    for index in range(count)
+                )
+            )
+
+        query_counts = []
+        for count in (5, 50):
+            with CaptureQueriesContext(connection) as context:
+                report = import_books(rows(count), "jsonl", chunk_size=100)
+            assert report.created == count
+            query_counts.append(len(context.captured_queries))
+        assert query_counts[0] == query_counts[1]
+
+    def test_import_jsonl_skips_malformed_lines(self):
+        stream = io.StringIO(
+            "not json\n"
+            + json.dumps(
+                {
+                    "title": "Book",
+                    "author": "Author",
+                    "year_published": 2000,
+                    "price": "5.00",
+                    "stock": 1,
+                    "category": self.fiction.id,
+                }
+            )
+            + "\n"
+        )
+        report = import_books(stream, "jsonl")
+        assert report.created == 1
+        assert report.errors[0]["row"] == 1
+
+    def test_import_endpoint(self):
+        upload = SimpleUploadedFile(
+            "books.csv",
+            b"title,author,year_published,price,stock,category\n"
+            b"Book A,Author A,2001,10.00,3,Fiction\n",
+            content_type="text/csv",
+        )
+        url = reverse("book-import-books")
+
+        response = self.client.post(url, {"file": upload}, format="multipart")
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        self.client.force_authenticate(user=self.admin_user)
+        upload.seek(0)
+        response = self.client.post(url, {"file": upload}, format="multipart")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created"] == 1
+        assert Book.objects.filter(title="Book A").exists()
+
+    def test_import_csv_reports_malformed_rows(self):
+        stream = io.StringIO(
+            "title,author,year_published,price,stock,category\n"
+            f"Book A,{'A' * 200000},2001,10.00,3,Fiction\n"
+            "Book B,Author B,2002,11.50,4,Fiction\n"
+        )
+        report = import_books(stream, "csv")
+        assert report.created == 1
+        assert report.errors[0]["row"] == 1
+        assert "Invalid CSV" in report.errors[0]["errors"]["non_field_errors"][0]
+
+    def test_import_reports_category_references_that_are_not_ids(self):
+        stream = io.StringIO(
+            "title,author,year_published,price,stock,category\n"
+            "Book A,Author A,2001,10.00,3,\u00b2\n"
+            f"Book B,Author B,2002,11.50,4,{'9' * 30}\n"
+            f"Book C,Author C,2003,12.00,5,{self.fiction.id}\n"
+        )
+        report = import_books(stream, "csv")
+        assert report.created == 1
+        assert [error["row"] for error in report.errors] == [1, 2]
+        assert report.errors[0]["errors"]["category"] == [
+            "This category does not exist."
+        ]
+
+    def test_import_endpoint_rejects_undecodable_files(self):
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("book-import-books")
+        header = b"title,author,year_published,price,stock,category\n"
+
+        upload = SimpleUploadedFile("books.csv", b"\xff\xfe" + header * 5000)
+        response = self.client.post(url, {"file": upload}, format="multipart")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["errors"][0]["row"] == 1
+
+        upload = SimpleUploadedFile(
+            "books.csv",
+            header
+            + b"Book A,Author A,2001,10.00,3,Fiction\n" * 5000
+            + b"Book B,Caf\xe9,2001,10.00,3,Fiction\n",
+        )
+        response = self.client.post(url, {"file": upload}, format="multipart")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created"] > 0
+        assert "UTF-8" in response.data["errors"][-1]["errors"]["non_field_errors"][0]
+
+    def test_import_command(self, tmp_path):
+        path = tmp_path / "books.csv"
+        path.write_text(
+            "title,author,year_published,price,stock,category\n"
+            "Book A,Author A,2001,10.00,3,Fiction\n"
+        )
+        stdout = io.StringIO()
+        call_command("import_books", str(path), stdout=stdout)
+        assert "Created 1 books" in stdout.getvalue()
+
+
+@pytest.mark.django_db
+class TestBookExport:
+    def setup_method(self):
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(
+            email="admin@example.com", password="admin"
+        )
+        self.category = Category.objects.create(name="Fiction")
+        for index in range(5):
+            Book.objects.create(
+                title=f"Book {index}",
+                author="Author, Jr.",
+                year_published=2000 + index,
+                category=self.category,
+                stock=index,
+                price="9.99",
+            )
+
+    def export(self, query=""):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(f"{reverse('book-export')}{query}")
+        assert response.status_code == status.HTTP_200_OK
+        return b"".join(response.streaming_content).decode()
+
+    def test_export_jsonl_matches_list(self):
+        content = self.export()
+        expected = json.loads(
+            JSONRenderer().render(self.client.get(reverse("book-list")).data)
+        )["results"]
+        assert [json.loads(line) for line in content.splitlines()] == expected
+        assert len(expected) == 4
+
+    def test_export_csv_can_be_imported(self):
+        content = self.export("?output=csv&year_published=2003")
+        lines = content.splitlines()
+        assert lines[0].split(",") == BookRowSerializer.field_names()
+        assert len(lines) == 2
+
+        Book.objects.all().delete()
+        report = import_books(io.StringIO(content), "csv")
+        assert report.created == 1
+        assert Book.objects.get().author == "Author, Jr."
+
+    def test_export_reads_the_catalog_with_one_query(self):
+        queryset = Book.objects.with_effective_stock().values(
+            *BookRowSerializer.value_fields()
+        )
+        with CaptureQueriesContext(connection) as context:
+            chunks = list(export_books(queryset, "jsonl", chunk_size=2))
+        assert len(chunks) == 2
+        assert len(context.captured_queries) == 1
+
+    def test_export_requires_admin_and_valid_output(self):
+        response = self.client.get(reverse("book-export"))
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(f"{reverse('book-export')}?output=xml")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestStockLedger:
+    def setup_method(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="buyer@example.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Ledger",
+            author="Author",
+            year_published=2021,
+            category=Category.objects.create(name="Fiction"),
+            stock=10,
+            price=9.99,
+        )
+
+    def movements(self):
+        return list(
+            StockMovement.objects.filter(book=self.book)
+            .order_by("pk")
+            .values_list("kind", "quantity", "folded")
+        )
+
+    def test_checkout_is_read_from_the_snapshot_and_the_tail(self, caplog):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, book=self.book, quantity=2)
+        self.client.force_authenticate(user=self.user)
+        detail_url = reverse("book-detail", kwargs={"pk": self.book.pk})
+        assert self.client.get(detail_url).data["stock"] == 10
+
+        response = self.client.post(reverse("checkout"))
+        assert response.status_code == status.HTTP_200_OK
+        assert self.movements() == [("checkout", -2, False)]
+        self.book.refresh_from_db()
+        assert (self.book.stock, self.book.reserved) == (10, 2)
+        assert self.client.get(detail_url).data["stock"] == 8
+        assert self.client.get(reverse("book-list")).data["results"][0]["stock"] == 8
+
+        with caplog.at_level(logging.INFO, logger="book.tasks"):
+            assert fold_stock_movements() == 1
+        (record,) = [r for r in caplog.records if r.name == "book.tasks"]
+        assert record.getMessage() == "Folded 1 stock movements."
+        assert (record.event, record.folded) == ("stock.movements_folded", 1)
+        assert self.movements() == [("checkout", -2, True)]
+        self.book.refresh_from_db()
+        assert (self.book.stock, self.book.reserved) == (8, 0)
+        assert self.client.get(detail_url).data["stock"] == 8
+
+    def test_stock_updates_are_recorded_as_deltas(self):
+        book = Book.objects.get(pk=self.book.pk)
+        assert Book.objects.reserve(self.book.pk, 2)
+        StockMovement.objects.record_checkout({self.book.pk: 2})
+        StockMovement.objects.fold()
+
+        book.stock += 5
+        book.save(update_stock=True)
+        assert book.stock == 13
+        book.stock -= 3
+        book.save(update_stock=True)
+        assert book.stock == 10
+        assert book.get_dirty_fields() == []
+
+        assert self.movements() == [
+            ("checkout", -2, True),
+            ("restock", 5, True),
+            ("adjustment", -3, True),
+        ]
+
+
+@pytest.mark.django_db
+class TestStockSlots:
+    def setup_method(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Fiction")
+        self.book = Book.objects.create(
+            title="Promotion",
+            author="Author",
+            year_published=2021,
+            category=self.category,
+            stock=10,
+            price=9.99,
+        )
+        assert Book.objects.reserve(self.book.pk, 2)
+
+    def slots(self):
+        return list(
+            StockSlot.objects.filter(book=self.book)
+            .order_by("index")
+            .values_list("quantity", flat=True)
+        )
+
+    def listed_stock(self):
+        results = self.client.get(reverse("book-list")).data["results"]
+        return [book["stock"] for book in results]
+
+    def test_split_keeps_stock_and_availability(self):
+        assert StockSlot.objects.split(self.book.pk, 3) == 8
+        assert self.slots() == [3, 3, 2]
+        self.book.refresh_from_db()
+        assert (self.book.stock, self.book.reserved) == (10, 10)
+        assert self.book.sharded
+        assert self.listed_stock() == [10]
+
+        assert StockSlot.objects.split(self.book.pk, 0) == 0
+        assert self.slots() == []
+        self.book.refresh_from_db()
+        assert self.book.reserved == 2
+        assert not self.book.sharded
+
+    def test_reservations_drain_the_slots(self):
+        StockSlot.objects.split(self.book.pk, 4)
+        assert Book.objects.reserve(self.book.pk, 2)
+        assert sorted(self.slots()) == [0, 2, 2, 2]
+        self.book.refresh_from_db()
+        assert self.book.reserved == 10
+
+        for _ in range(6):
+            assert Book.objects.reserve(self.book.pk)
+        assert not Book.objects.reserve(self.book.pk)
+        assert self.listed_stock() == []
+        self.category.refresh_from_db()
+        assert self.category.in_stock_count == 0
+        assert Category.objects.reconcile_counts() == 0
+
+    def test_emptying_a_slot_after_a_concurrent_take_sells_out(self):
+        StockSlot.objects.split(self.book.pk, 1)
+        assert Book.objects.reserve(self.book.pk, 6)
+        assert self.slots() == [2]
+
+        def concurrent_take(candidates):
+            StockSlot.objects.filter(book=self.book).update(quantity=F("quantity") - 1)
+
+        with patch("book.models.random.shuffle", concurrent_take):
+            assert StockSlot.objects.take(self.book.pk)
+        assert self.slots() == [0]
+        self.category.refresh_from_db()
+        assert self.category.in_stock_count == 0
+        assert Category.objects.reconcile_counts() == 0
+
+    def test_deleting_a_sharded_book_updates_the_counts(self):
+        StockSlot.objects.split(self.book.pk, 4)
+        Book.objects.get(pk=self.book.pk).delete()
+
+        self.category.refresh_from_db()
+        assert (self.category.book_count, self.category.in_stock_count) == (0, 0)
+        assert Category.objects.reconcile_counts() == 0
+
+    def test_released_copies_return_to_the_row(self):
+        StockSlot.objects.split(self.book.pk, 2)
+        user = User.objects.create_user(email="buyer@example.com", password="pw")
+        cart = Cart.objects.create(user=user)
+        self.client.force_authenticate(user=user)
+        response = self.client.post(
+            reverse("add-books-to-cart"), {"book_ids": [self.book.pk]}, format="json"
+        )
+        assert response.data["results"][0]["status"] == "added"
+        assert sum(self.slots()) == 7
+
+        cart.items.get().delete()
+        self.book.refresh_from_db()
+        assert self.book.stock - self.book.reserved == 1
+        assert Book.objects.reserve(self.book.pk)
+        assert sum(self.slots()) == 7
+
+    def test_stock_reduction_splits_the_slots_again(self):
+        StockSlot.objects.split(self.book.pk, 4)
+        book = Book.objects.get(pk=self.book.pk)
+        book.stock -= 5
+        book.save(update_stock=True)
+
+        assert self.slots() == [1, 1, 1, 0]
+        assert self.listed_stock() == [5]
+        assert Category.objects.reconcile_counts() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+class TestReplicaRouting:
+    @pytest.fixture(autouse=True)
+    def setup(self, replicas):
+        self.client = APIClient()
+        self.replicas = replicas
+        category = Category.objects.create(name="Fiction")
+        self.book = Book.objects.create(
+            title="Replicated",
+            author="Author",
+            year_published=2020,
+            category=category,
+            stock=3,
+            price=10,
+        )
+
+    def test_list_books_reads_from_replicas(self):
+        with capture_queries("default", *self.replicas) as queries:
+            response = self.client.get(reverse("book-list"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["count"] == 1
+        assert len(queries["default"]) == 0
+        assert sum(len(queries[alias]) for alias in self.replicas) > 0
+
+    def test_list_categories_reads_from_replicas(self):
+        with capture_queries("default", *self.replicas) as queries:
+            response = self.client.get(reverse("category-list"))
+        assert response.status_code == status.HTTP_200_OK
+        assert len(queries["default"]) == 0
+
+    def test_writes_go_to_primary(self):
+        admin = User.objects.create_superuser(email="admin@example.com", password="a")
+        self.client.force_authenticate(user=admin)
+        with capture_queries("default", *self.replicas) as queries:
+            response = self.client.patch(
+                reverse("book-detail", args=[self.book.pk]), {"title": "Renamed"}
+            )
+        assert response.status_code == status.HTTP_200_OK
+        assert all(len(queries[alias]) == 0 for alias in self.replicas)
+        self.book.refresh_from_db()
+        assert self.book.title == "Renamed"
+
+    def test_replica_responses_are_not_cached_right_after_a_write(self, settings):
+        url = reverse("book-list")
+        self.client.get(url)
+        with capture_queries(*self.replicas) as queries:
+            self.client.get(url)
+        assert sum(len(queries[alias]) for alias in self.replicas) > 0
+
+        settings.REPLICA_PIN_SECONDS = 0
+        self.client.get(url)
+        with capture_queries(*self.replicas) as queries:
+            response = self.client.get(url)
+        assert response.data["count"] == 1
+        assert sum(len(queries[alias]) for alias in self.replicas) == 0
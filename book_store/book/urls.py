@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BookViewSet
+from .views import AsyncBookView, BookViewSet
 
 router = DefaultRouter()
 router.register(r"", BookViewSet, basename="book")
 
 urlpatterns = [
+    path("async/", AsyncBookView.as_view(), name="book-async-list"),
+    path("async/<int:pk>/", AsyncBookView.as_view(), name="book-async-detail"),
     path("", include(router.urls)),
 ]
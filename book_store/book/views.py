@@ -1,24 +1,27 @@
+import io
+import os
+
 import django_filters
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 
-from rest_framework import permissions, viewsets
-from rest_framework.pagination import PageNumberPagination
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
 
+from .exporters import CONTENT_TYPES, export_books
+from .importers import FORMATS, import_books
 from .models import Book
-from .serializers import BookSerializer
+from .pagination import StandardResultsSetPagination, TitleCursorPagination
+from .search import search_books
+from .serializers import BookRowSerializer, BookSerializer
+from book_store.async_views import AsyncReadOnlyView
+from book_store.cache import CachedResponseMixin
+from book_store.db_routers import ReplicaReadMixin
 from category.models import Category
 
 
-class StandardResultsSetPagination(PageNumberPagination):
-    """
-    Custom pagination class to define page size and limits for API responses.
-    """
-
-    page_size = 100
-    page_size_query_param = "page_size"
-    max_page_size = 1000
-
-
 class BookFilter(django_filters.FilterSet):
     """
     Custom filter class for the Book model, allowing filtering by various fields.
@@ -38,7 +41,7 @@ class BookFilter(django_filters.FilterSet):
         ]
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing book instances.
     """
@@ -53,21 +56,163 @@ class BookViewSet(viewsets.ModelViewSet):
         "category",
     ]
     pagination_class = StandardResultsSetPagination
+    cache_namespace = "books"
+    cursor_pagination_class = TitleCursorPagination
+
+    @property
+    def paginator(self):
+        """
+        Return the paginator instance for the request.
+
+        Clients opt in to keyset pagination with `?pagination=cursor` and then
+        follow the returned cursors; page-number pagination is used otherwise,
+        and always for search results, which are ordered by relevance.
+        """
+        if not hasattr(self, "_paginator"):
+            request = getattr(self, "request", None)
+            query_params = request.query_params if request is not None else {}
+            if self.action != "search" and (
+                query_params.get("pagination") == "cursor"
+                or self.cursor_pagination_class.cursor_query_param in query_params
+            ):
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self):
         """
         Return a queryset of books, ensuring only those with effective stock are listed.
+
+        The list action reads plain rows with `values()`, which are serialized by
+        BookRowSerializer.
+        """
+        queryset = Book.objects.with_effective_stock().order_by("title", "id")
+        if self.action == "list":
+            queryset = queryset.values(*BookRowSerializer.value_fields())
+        return queryset
+
+    def get_serializer_class(self):
+        """
+        Return BookRowSerializer for the list action and BookSerializer otherwise.
+        """
+        if self.action == "list" and not getattr(self, "swagger_fake_view", False):
+            return BookRowSerializer
+        return super().get_serializer_class()
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """
+        Return the in-stock books whose title or author match the `q` query
+        parameter, best matches first.
+        """
+        return self.cached_response(self.search_results, request)
+
+    def search_results(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response(
+                {"q": ["This query parameter is required."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = search_books(self.filter_queryset(self.get_queryset()), query)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser],
+    )
+    def import_books(self, request):
+        """
+        Import books from an uploaded CSV or JSON Lines `file`.
+
+        The format is taken from the `format` form field or from the file name.
+        Invalid rows are reported without aborting the import, and a file that
+        is not valid UTF-8 is rejected when none of its books could be imported.
         """
-        return Book.objects.with_effective_stock().order_by("title")
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"file": ["This field is required."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        extension = os.path.splitext(upload.name)[1].lstrip(".")
+        file_format = request.data.get("format") or extension
+        if file_format not in FORMATS:
+            return Response(
+                {"format": [f"Must be one of: {', '.join(FORMATS)}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+        report = import_books(stream, file_format)
+        if report.undecodable and not report.created:
+            return Response(report.as_dict(), status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        Stream every in-stock book matching the filters as JSON Lines or CSV.
+
+        The format is taken from the `output` query parameter, as `format` is
+        reserved for DRF's content negotiation. The whole export is read by one
+        query and streamed in chunks instead of being paginated.
+        """
+        file_format = request.query_params.get("output", "jsonl")
+        if file_format not in CONTENT_TYPES:
+            return Response(
+                {"output": [f"Must be one of: {', '.join(CONTENT_TYPES)}."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *BookRowSerializer.value_fields()
+        )
+        response = StreamingHttpResponse(
+            export_books(queryset, file_format),
+            content_type=CONTENT_TYPES[file_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="books.{file_format}"'
+        return response
 
     def get_permissions(self):
         """
         Return the appropriate permission classes based on the action being performed.
-        Actions 'list' and 'retrieve' are available to any user, while other actions
+        Actions 'list', 'retrieve' and 'search' are available to any user, while other actions
         require the user to be authenticated and to be an admin.
         """
-        if self.action in ["list", "retrieve"]:
+        if self.action in ["list", "retrieve", "search"]:
             permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
         return [permission() for permission in permission_classes]
+
+
+class AsyncBookView(AsyncReadOnlyView):
+    """
+    Async list and retrieve views of the in-stock books.
+
+    Serves the same data and filters as BookViewSet, with page-number
+    pagination, using the async ORM.
+    """
+
+    filterset_class = BookFilter
+    pagination_class = StandardResultsSetPagination
+
+    def get_queryset(self):
+        queryset = Book.objects.with_effective_stock().order_by("title", "id")
+        if self.action == "list":
+            queryset = queryset.values(*BookRowSerializer.value_fields())
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return BookRowSerializer
+        return BookSerializer
@@ -0,0 +1,140 @@
+"""
+Async read-only views for the public catalog.
+
+Under ASGI these views await the database through Django's async ORM instead
+of running in the thread-sensitive wrapper that serves sync views, so a
+request that waits on the database or on a slow client does not hold a worker
+thread. They return the same data as the list and retrieve actions of the DRF
+viewsets, with page-number pagination, but bypass the response cache.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from rest_framework.pagination import _positive_int
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class AsyncReadOnlyView(View):
+    """
+    Async list and retrieve view for a model.
+
+    Subclasses set `queryset`, `serializer_class`, and optionally
+    `filterset_class` and `pagination_class`. As in a viewset, `self.action` is
+    "list" or "retrieve" while `get_queryset` and `get_serializer_class` run.
+    """
+
+    http_method_names = ["get", "head", "options"]
+    queryset = None
+    serializer_class = None
+    filterset_class = None
+    pagination_class = None
+
+    def get_queryset(self):
+        return self.queryset.all()
+
+    def get_serializer_class(self):
+        return self.serializer_class
+
+    async def get(self, request, pk=None):
+        if pk is None:
+            self.action = "list"
+            return await self.list(request)
+        self.action = "retrieve"
+        return await self.retrieve(request, pk)
+
+    async def list(self, request):
+        """
+        Return the filtered objects, one page at a time if a pagination class is set.
+        """
+        queryset = self.get_queryset()
+        if self.filterset_class is not None:
+            filterset = self.filterset_class(
+                request.GET, queryset=queryset, request=request
+            )
+            # Validating a filter can query the database, e.g. for the
+            # choices of a model choice filter, so it runs in a thread.
+            if not await sync_to_async(filterset.is_valid)():
+                return self.response(filterset.errors, status=400)
+            queryset = filterset.filter_queryset(queryset)
+
+        serializer_class = self.get_serializer_class()
+        if self.pagination_class is None:
+            objects = [obj async for obj in queryset]
+            return self.response(serializer_class(objects, many=True).data)
+
+        page = await self.paginate(request, queryset)
+        if page is None:
+            return self.response({"detail": "Invalid page."}, status=404)
+        page["results"] = serializer_class(page["results"], many=True).data
+        return self.response(page)
+
+    async def retrieve(self, request, pk):
+        """
+        Return the object with the given primary key.
+        """
+        obj = await self.get_queryset().filter(pk=pk).afirst()
+        if obj is None:
+            return self.response({"detail": "Not found."}, status=404)
+        return self.response(self.get_serializer_class()(obj).data)
+
+    async def paginate(self, request, queryset):
+        """
+        Return the requested page in the format of DRF's PageNumberPagination.
+
+        The page size settings are read from `pagination_class`. Returns None
+        if the requested page does not exist.
+
+        Args:
+            request (HttpRequest): The request being served.
+            queryset (QuerySet): The ordered queryset to paginate.
+
+        Returns:
+            dict: The count, next and previous links and results of the page.
+        """
+        pagination = self.pagination_class
+        page_size = pagination.page_size
+        if pagination.page_size_query_param in request.GET:
+            try:
+                page_size = _positive_int(
+                    request.GET[pagination.page_size_query_param],
+                    strict=True,
+                    cutoff=pagination.max_page_size,
+                )
+            except (KeyError, ValueError):
+                pass
+
+        try:
+            page_number = _positive_int(
+                request.GET.get(pagination.page_query_param, 1), strict=True
+            )
+        except ValueError:
+            return None
+
+        count = await queryset.acount()
+        offset = (page_number - 1) * page_size
+        if offset >= count and page_number != 1:
+            return None
+        results = [obj async for obj in queryset[offset : offset + page_size]]
+
+        url = request.build_absolute_uri()
+        next_link = previous_link = None
+        if offset + page_size < count:
+            next_link = replace_query_param(
+                url, pagination.page_query_param, page_number + 1
+            )
+        if page_number == 2:
+            previous_link = remove_query_param(url, pagination.page_query_param)
+        elif page_number > 2:
+            previous_link = replace_query_param(
+                url, pagination.page_query_param, page_number - 1
+            )
+        return {
+            "count": count,
+            "next": next_link,
+            "previous": previous_link,
+            "results": results,
+        }
+
+    def response(self, data, status=200):
+        return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
@@ -0,0 +1,134 @@
+"""
+Versioned response cache for the public catalog endpoints.
+
+Responses are stored in the default cache under a key made of a namespace
+version, the request path and its query parameters. Invalidating a namespace
+starts a new version, so every response cached under the previous one is
+ignored without having to enumerate its keys. This works with any cache
+backend, including locmem and file based caches.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from book_store.db_routers import reads_from_replica
+
+VERSION_KEY = "response-cache:{namespace}:version"
+RESPONSE_KEY = "response-cache:{namespace}:{version}:{digest}"
+
+
+def get_version(namespace):
+    """
+    Return the current version of a cache namespace, creating it if needed.
+
+    The version is the timestamp of the namespace's last invalidation, which
+    also serves as the Last-Modified time of the responses cached under it.
+    """
+    key = VERSION_KEY.format(namespace=namespace)
+    version = cache.get(key)
+    if version is None:
+        version = time.time()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def invalidate(*namespaces):
+    """
+    Discard every cached response of the given namespaces.
+
+    The namespaces are invalidated immediately and once more when the current
+    transaction commits, so a response cached from a concurrent read of the
+    uncommitted state is not kept.
+    """
+
+    def bump():
+        now = time.time()
+        cache.set_many(
+            {VERSION_KEY.format(namespace=namespace): now for namespace in namespaces},
+            timeout=None,
+        )
+
+    bump()
+    transaction.on_commit(bump)
+
+
+class CachedResponseMixin:
+    """
+    ViewSet mixin that caches the list and retrieve responses in the shared cache.
+
+    Cached responses carry ETag and Last-Modified headers, and conditional
+    requests that match them get a 304 without touching the database.
+    """
+
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        """
+        Return the cached response for the request, calling `handler` on a miss.
+        """
+        if self.cache_namespace is None:
+            return handler(request, *args, **kwargs)
+
+        version = get_version(self.cache_namespace)
+        query = urlencode(sorted(request.GET.lists()), doseq=True)
+        digest = hashlib.md5(f"{request.path}?{query}".encode()).hexdigest()
+        key = RESPONSE_KEY.format(
+            namespace=self.cache_namespace, version=repr(version), digest=digest
+        )
+        headers = {
+            "ETag": quote_etag(hashlib.md5(key.encode()).hexdigest()),
+            "Last-Modified": http_date(version),
+        }
+
+        if self.is_not_modified(request, headers["ETag"], version):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            # A replica may not have replayed the write that started this
+            # version yet, so its responses are only cached once the version
+            # is older than the replication window.
+            if (
+                not reads_from_replica()
+                or time.time() - version >= settings.REPLICA_PIN_SECONDS
+            ):
+                cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        else:
+            response = Response(data)
+
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def is_not_modified(self, request, etag, version):
+        """
+        Return whether the client's conditional headers match the cached response.
+        """
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(",")]
+
+        # Last-Modified has whole seconds, so it is compared with the exact
+        # version: a client echoing it back is not told that a response
+        # cached later in the same second is unchanged.
+        if_modified_since = parse_http_date_safe(
+            request.headers.get("If-Modified-Since", "")
+        )
+        return if_modified_since is not None and if_modified_since >= version
@@ -0,0 +1,178 @@
+"""
+Primary/replica database routing with read-your-writes stickiness.
+
+Writes always go to the primary (`default`) database. Reads go to a random
+replica listed in `settings.REPLICA_DATABASES` only inside views that opt in
+with `ReplicaReadMixin`, and only for safe methods, so code that reads its own
+writes elsewhere keeps reading from the primary.
+
+`ReplicaPinMiddleware` keeps the routing state of each request. Once a request
+has used the primary for writing, its remaining reads go to the primary as
+well, and the authenticated user is pinned to the primary for
+`settings.REPLICA_PIN_SECONDS` so their next requests read their own writes
+while the replicas catch up. Pins are kept in the default cache, which must be
+shared by all processes (Redis, see CACHES) for a write served by one worker
+to pin the reads served by the others.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_KEY = "replica-pin:{user_id}"
+
+routing_state = ContextVar("routing_state", default=None)
+
+
+class RoutingState:
+    """
+    Routing decisions of the request being served.
+
+    Attributes:
+        use_replicas (bool): Whether reads may go to a replica.
+        wrote (bool): Whether the request has used the primary for writing.
+        read_from_replica (bool): Whether a read was routed to a replica.
+    """
+
+    def __init__(self):
+        self.use_replicas = False
+        self.wrote = False
+        self.read_from_replica = False
+
+
+def get_pin_key(user):
+    return PIN_KEY.format(user_id=user.pk)
+
+
+def pin_to_primary(user):
+    """
+    Send the user's reads to the primary for the next `REPLICA_PIN_SECONDS`.
+    """
+    cache.set(get_pin_key(user), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    """
+    Return whether the user wrote recently enough to read from the primary.
+    """
+    return user.is_authenticated and cache.get(get_pin_key(user)) is not None
+
+
+def read_from_replicas(user):
+    """
+    Let the reads of the current request go to a replica, unless `user` is pinned.
+    """
+    state = routing_state.get()
+    if state is None or not settings.REPLICA_DATABASES:
+        return
+    state.use_replicas = not is_pinned(user)
+
+
+def reads_from_replica():
+    """
+    Return whether the current request has read from a replica.
+    """
+    state = routing_state.get()
+    return state is not None and state.read_from_replica
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router sending writes to the primary and opted-in reads to replicas.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = routing_state.get()
+        if state is None or not state.use_replicas or state.wrote:
+            return DEFAULT_DB_ALIAS
+        replicas = settings.REPLICA_DATABASES
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        state.read_from_replica = True
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema from the primary.
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """
+    Middleware that keeps the routing state of each request and pins writers.
+
+    It runs after the view, once DRF has authenticated the user, and supports
+    both sync and async requests.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = RoutingState()
+        token = routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        self.pin_writer(request, state)
+        return response
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing_state.reset(token)
+        self.pin_writer(request, state)
+        return response
+
+    def pin_writer(self, request, state):
+        user = getattr(request, "user", None)
+        if (
+            state.wrote
+            and settings.REPLICA_DATABASES
+            and user is not None
+            and user.is_authenticated
+        ):
+            pin_to_primary(user)
+
+
+class ReplicaReadMixin:
+    """
+    DRF view mixin that serves GET, HEAD and OPTIONS requests from a replica.
+
+    The choice is made after authentication, so users who wrote recently
+    keep reading from the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            read_from_replicas(request.user)
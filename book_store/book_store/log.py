@@ -0,0 +1,198 @@
+"""
+Non-blocking, structured logging for the request hot paths.
+
+Request threads only put log records on an in-memory queue through
+`QueueHandler`. A listener thread formats them and writes them to the real
+handlers, so a slow stdout or log collector never stalls a request. When the
+queue is full the record is dropped rather than blocking the caller.
+
+Events are logged with lazy %-style arguments and key/value fields passed as
+`extra`, for example::
+
+    logger.info(
+        "Cart retrieved for user %s",
+        user.email,
+        extra={"event": "cart.retrieved", "user_id": user.pk},
+    )
+
+`KeyValueFormatter` renders the fields as `key=value` pairs, and
+`SamplingFilter` keeps only a configured fraction of high-volume INFO events.
+"""
+import atexit
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import weakref
+
+RESERVED_ATTRS = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", (), None))
+) | {"message", "asctime", "sample_rate"}
+
+
+def get_fields(record):
+    """
+    Return the key/value fields passed to the logging call as `extra`.
+    """
+    return {
+        key: value
+        for key, value in vars(record).items()
+        if key not in RESERVED_ATTRS and not key.startswith("_")
+    }
+
+
+def format_value(value):
+    """
+    Return `value` as a logfmt value, quoted when it contains spaces or quotes.
+    """
+    value = str(value)
+    if not value or any(char in value for char in ' ="\n'):
+        value = '"{}"'.format(
+            value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+    return value
+
+
+class KeyValueFormatter(logging.Formatter):
+    """
+    Formatter that renders a record as a line of `key=value` pairs.
+
+    The line starts with the time, level, logger and message, followed by
+    the fields passed as `extra` and by the sample rate of sampled events.
+    """
+
+    def format(self, record):
+        record.message = record.getMessage()
+        pairs = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.message,
+            **get_fields(record),
+        }
+        if getattr(record, "sample_rate", None) is not None:
+            pairs["sample_rate"] = record.sample_rate
+        line = " ".join(f"{key}={format_value(value)}" for key, value in pairs.items())
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line = f"{line}\n{record.exc_text}"
+        if record.stack_info:
+            line = f"{line}\n{self.formatStack(record.stack_info)}"
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Filter that keeps only a fraction of the records of high-volume events.
+
+    Records below WARNING whose `event` field has a rate in `rates` are kept
+    with that probability, and the rate is stored on the record as
+    `sample_rate` so counts can be scaled back. Other records always pass.
+
+    Args:
+        rates (dict): Mapping of event name to the fraction of its records to
+            keep, between 0 and 1.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None or rate >= 1:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Handler that hands records to a listener thread writing to `handlers`.
+
+    Python 3.11's dictConfig cannot attach a QueueListener, so the handler
+    creates and starts its own. The listeners of all handlers are stopped,
+    flushing their queues, at exit and restarted in forked children, such as
+    Celery pool workers, by hooks registered once for the module.
+
+    Args:
+        handlers (list): The handlers that format and write the records, e.g.
+            "cfg://handlers.console" references in the logging configuration.
+            dictConfig configures handlers in name order, so the referenced
+            handlers must sort before this one.
+        maxsize (int): Number of records the queue holds before new records
+            are dropped.
+    """
+
+    def __init__(self, handlers, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        # Indexing, unlike iterating, makes dictConfig resolve cfg:// references.
+        self.handlers = [handlers[index] for index in range(len(handlers))]
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.listener = self.start_listener()
+
+    def start_listener(self):
+        listener = logging.handlers.QueueListener(
+            self.queue, *self.handlers, respect_handler_level=True
+        )
+        listener.start()
+        _listening.add(self)
+        return listener
+
+    def stop_listener(self):
+        _listening.discard(self)
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def restart_listener(self):
+        # Only the forking thread survives in the child, so the listener's
+        # thread is gone and records already queued belong to the parent.
+        self.queue = queue.Queue(self.maxsize)
+        self.listener = self.start_listener()
+
+    def prepare(self, record):
+        """
+        Merge the message arguments, leaving the formatting to the listener.
+
+        The arguments are merged in the calling thread because they may be
+        objects that change after the call returns, but the formatter, which
+        renders the fields, the time and any traceback, runs on the listener.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# Handlers whose listener is running, stopped at exit and restarted after a
+# fork. The references are weak so that handlers dropped by a reconfiguration
+# of logging can be collected.
+_listening = weakref.WeakSet()
+
+
+def _stop_listeners():
+    for handler in list(_listening):
+        handler.stop_listener()
+
+
+def _restart_listeners():
+    for handler in list(_listening):
+        handler.restart_listener()
+
+
+atexit.register(_stop_listeners)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listeners)
@@ -0,0 +1,181 @@
+"""
+Prometheus metrics of the API and of the cart tasks.
+
+PrometheusMiddleware records the latency of every request per view name, and
+the number and total duration of the database queries it ran.
+The cart tasks count their outcomes, the stock ledger task counts the
+movements it folds, and the /metrics view also reports how many expired
+reservations are waiting for the release task.
+
+When the API runs in several worker processes, set the
+PROMETHEUS_MULTIPROC_DIR environment variable to an empty directory shared by
+the workers before they start. The /metrics view then aggregates the values
+written by every process.
+"""
+import contextlib
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connections
+from django.http import HttpResponse
+from django.utils import timezone
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+REQUEST_LATENCY = Histogram(
+    "bookstore_request_duration_seconds",
+    "Time spent serving a request.",
+    ["view", "method", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "bookstore_request_db_queries",
+    "Number of database queries run by a request.",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+REQUEST_QUERY_DURATION = Histogram(
+    "bookstore_request_db_query_duration_seconds",
+    "Total time spent in database queries by a request.",
+    ["view"],
+)
+CART_ITEM_RELEASES = Counter(
+    "bookstore_cart_item_releases",
+    "Outcomes of the release_book_from_cart task.",
+    ["outcome"],
+)
+EXPIRED_CART_ITEMS_RELEASED = Counter(
+    "bookstore_expired_cart_items_released",
+    "Cart items released by the release_expired_cart_items task.",
+)
+STOCK_MOVEMENTS_FOLDED = Counter(
+    "bookstore_stock_movements_folded",
+    "Stock movements folded into book stock by the fold_stock_movements task.",
+)
+
+
+class QueryStats:
+    """
+    Database execute wrapper that counts and times the queries it sees.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+def get_view_name(request):
+    """
+    Return the URL name of the view that served the request, for use as a label.
+    """
+    resolver_match = getattr(request, "resolver_match", None)
+    if resolver_match is None:
+        return "unmatched"
+    return resolver_match.view_name or resolver_match._func_path
+
+
+class PrometheusMiddleware:
+    """
+    Middleware that records request latency and database usage per view.
+
+    It supports both sync and async requests, so it does not force async views
+    to run in a thread. Under ASGI, sync views and the database calls of async
+    views run on the thread of the request's thread-sensitive context, so the
+    query wrappers are installed and removed on that thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        queries = QueryStats()
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            self.wrap_queries(stack, queries)
+            response = self.get_response(request)
+        self.observe(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryStats()
+        stack = contextlib.ExitStack()
+        await sync_to_async(self.wrap_queries)(stack, queries)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.observe(request, response, time.perf_counter() - start, queries)
+        return response
+
+    def wrap_queries(self, stack, queries):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(queries))
+
+    def observe(self, request, response, duration, queries):
+        view = get_view_name(request)
+        REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(
+            duration
+        )
+        REQUEST_QUERIES.labels(view).observe(queries.count)
+        REQUEST_QUERY_DURATION.labels(view).observe(queries.duration)
+
+
+class ReservationBacklogCollector:
+    """
+    Collector that reports the cart items whose reservation expired but which
+    were not released yet.
+    """
+
+    def collect(self):
+        from cart.models import CartItem
+
+        backlog = GaugeMetricFamily(
+            "bookstore_expired_cart_items_pending",
+            "Cart items whose reservation expired and that are not released yet.",
+        )
+        backlog.add_metric(
+            [], CartItem.objects.filter(expires_at__lte=timezone.now()).count()
+        )
+        yield backlog
+
+
+backlog_registry = CollectorRegistry(auto_describe=False)
+backlog_registry.register(ReservationBacklogCollector())
+
+
+def metrics_view(request):
+    """
+    Expose the metrics in the Prometheus text format.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    output = generate_latest(registry) + generate_latest(backlog_registry)
+    return HttpResponse(output, content_type=CONTENT_TYPE_LATEST)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,16 +45,32 @@ INSTALLED_APPS = [
     "book",
     "category",
     "cart",
+    "benchmark",
     "drf_yasg",
 ]
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "account.authentication.CachedTokenAuthentication",
     ],
 }
 
+# Caching of resolved auth tokens, see account/authentication.py. Entries are
+# kept for TOKEN_CACHE_TIMEOUT seconds in the shared cache and for
+# TOKEN_CACHE_LOCAL_TIMEOUT seconds in each process, which bounds how long a
+# revoked token stays valid in the processes that did not revoke it.
+TOKEN_CACHE_TIMEOUT = 300
+TOKEN_CACHE_LOCAL_TIMEOUT = 10
+TOKEN_CACHE_LOCAL_MAX_ENTRIES = 10000
+
+# Threads that hash passwords for the async account views and the number of
+# hashes allowed to wait for one, see account/hashing.py.
+PASSWORD_HASHING_MAX_WORKERS = os.cpu_count() or 1
+PASSWORD_HASHING_MAX_PENDING = 64
+
 MIDDLEWARE = [
+    "book_store.metrics.PrometheusMiddleware",
+    "book_store.db_routers.ReplicaPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -94,6 +111,42 @@ DATABASES = {
     }
 }
 
+# Read replicas, as a comma-separated list of SQLite files. Locally, copies of
+# db.sqlite3 (or db.sqlite3 itself) can stand in for replicas. In tests they
+# mirror the test database.
+for index, name in enumerate(
+    name for name in os.environ.get("DATABASE_REPLICAS", "").split(",") if name
+):
+    DATABASES[f"replica_{index + 1}"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": name,
+        "TEST": {"MIRROR": "default"},
+    }
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != "default"]
+
+DATABASE_ROUTERS = ["book_store.db_routers.PrimaryReplicaRouter"]
+
+# Seconds during which a user who wrote keeps reading from the primary.
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", "5"))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# The cache must be shared by every web and Celery worker: the response cache
+# versions, the auth token cache and the replica pins are only invalidated
+# where they are written. Tests use a local memory cache, see test_settings.py.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("CACHE_URL", "redis://localhost:6379/1"),
+    }
+}
+
+# Number of seconds a cached catalog response is kept, see book_store/cache.py.
+RESPONSE_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -113,17 +166,42 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Fraction of the records of high-volume INFO events that is logged.
+LOG_SAMPLE_RATES = {
+    "cart.retrieved": float(os.environ.get("LOG_SAMPLE_RATE_CART_RETRIEVED", "1")),
+}
+
+# Records are queued by the request threads and formatted and written by a
+# listener thread, see book_store.log.
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
+    "formatters": {
+        "key_value": {
+            "()": "book_store.log.KeyValueFormatter",
+        },
+    },
+    "filters": {
+        "sampling": {
+            "()": "book_store.log.SamplingFilter",
+            "rates": LOG_SAMPLE_RATES,
+        },
+    },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
+            "formatter": "key_value",
+        },
+        "queue": {
+            "()": "book_store.log.QueueHandler",
+            "handlers": ["cfg://handlers.console"],
+            "maxsize": 10000,
+            "filters": ["sampling"],
         },
     },
     "loggers": {
         "": {
-            "handlers": ["console"],
+            "handlers": ["queue"],
             "level": "INFO",
         },
     },
@@ -156,3 +234,24 @@ AUTH_USER_MODEL = "account.CustomUser"
 
 CELERY_BROKER_URL = "redis://localhost:6379/0"
 CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
+CELERY_BEAT_SCHEDULE = {
+    "release-expired-cart-items": {
+        "task": "cart.tasks.release_expired_cart_items",
+        "schedule": 60.0,
+    },
+    "fold-stock-movements": {
+        "task": "book.tasks.fold_stock_movements",
+        "schedule": 10.0,
+    },
+    "reconcile-category-counts": {
+        "task": "category.tasks.reconcile_category_counts",
+        "schedule": 3600.0,
+    },
+}
+
+# Number of seconds a book stays reserved in a cart before it is released.
+CART_RESERVATION_TIMEOUT = 1800
+
+# Number of stock slots the unreserved stock of a book is split over when it is
+# sharded from the admin.
+STOCK_SLOTS = int(os.environ.get("STOCK_SLOTS", "8"))
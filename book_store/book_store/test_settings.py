@@ -0,0 +1,10 @@
+"""
+Settings for the test suite, which runs without a Redis server.
+"""
+from .settings import *  # noqa: F401,F403
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
@@ -0,0 +1,105 @@
+"""
+Test helpers for keeping the number of SQL queries of an endpoint in check.
+
+`query_budget` fails when the code it wraps runs more queries than allowed.
+Its failure message lists the queries grouped by their template, with the
+literal values replaced by placeholders, so a query repeated once per item
+(an N+1 pattern) stands out at the top of the report.
+"""
+import re
+from collections import Counter
+from contextlib import ContextDecorator, ExitStack, contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+LITERAL_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r'"s\d+_x\d+"'), '"?"'),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)"), "(...)"),
+]
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when the code under test runs more queries than its budget allows.
+    """
+
+
+def get_template(sql):
+    """
+    Return `sql` with its literal values replaced by placeholders.
+    """
+    for pattern, placeholder in LITERAL_PATTERNS:
+        sql = pattern.sub(placeholder, sql)
+    return sql
+
+
+def format_queries(queries):
+    """
+    Return a report of the queries grouped by template, most repeated first.
+
+    Args:
+        queries (list): Captured queries, as dicts with a "sql" key.
+
+    Returns:
+        str: One line per template with its number of executions.
+    """
+    templates = Counter(get_template(query["sql"]) for query in queries)
+    return "\n".join(
+        f"{count:>4} x {template}" for template, count in templates.most_common()
+    )
+
+
+class query_budget(ContextDecorator):
+    """
+    Context manager and decorator that limits the number of queries run inside it.
+
+    The budget is `max_queries` plus `per_item` queries for each of `items`
+    items, so a test can state that an endpoint's queries may not grow (the
+    default) or may only grow linearly with the number of items it handles.
+
+    Args:
+        max_queries (int): Number of queries allowed regardless of the items.
+        per_item (int): Number of additional queries allowed per item.
+        items (int): Number of items handled by the code under test.
+        using (str): Alias of the database whose queries are counted.
+    """
+
+    def __init__(self, max_queries, per_item=0, items=0, using="default"):
+        self.limit = max_queries + per_item * items
+        self.using = using
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        self.context.__enter__()
+        return self.context
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+
+        executed = len(self.context)
+        if executed > self.limit:
+            raise QueryBudgetExceeded(
+                f"{executed} queries executed, the budget is {self.limit}:\n"
+                f"{format_queries(self.context.captured_queries)}"
+            )
+        return False
+
+
+@contextmanager
+def capture_queries(*aliases):
+    """
+    Capture the queries run on each of the given databases.
+
+    Yields:
+        dict: Mapping of database alias to its CaptureQueriesContext.
+    """
+    with ExitStack() as stack:
+        yield {
+            alias: stack.enter_context(CaptureQueriesContext(connections[alias]))
+            for alias in aliases
+        }
@@ -20,6 +20,8 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
 
+from .metrics import metrics_view
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Book Store API",
@@ -37,6 +39,7 @@ urlpatterns = [
     path("books/", include("book.urls")),
     path("cart/", include("cart.urls")),
     path("categories/", include("category.urls")),
+    path("metrics", metrics_view, name="metrics"),
     path("redoc/", schema_view.with_ui("redoc", cache_timeout=0), name="schema-redoc"),
     path(
         "swagger/",
@@ -11,6 +11,6 @@ class CartAdmin(admin.ModelAdmin):
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
-    list_display = ("cart", "book", "quantity", "added_at")
+    list_display = ("cart", "book", "quantity", "added_at", "expires_at")
     search_fields = ("cart__user__email", "book__title")
     list_filter = ("book",)
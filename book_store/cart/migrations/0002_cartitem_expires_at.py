@@ -0,0 +1,32 @@
+# Generated by Django 5.0 on 2026-10-17 15:31
+
+from datetime import timedelta
+
+import cart.models
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_expires_at(apps, schema_editor):
+    CartItem = apps.get_model("cart", "CartItem")
+    CartItem.objects.using(schema_editor.connection.alias).update(
+        expires_at=F("added_at") + timedelta(seconds=settings.CART_RESERVATION_TIMEOUT)
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cart", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cartitem",
+            name="expires_at",
+            field=models.DateTimeField(
+                db_index=True, default=cart.models.default_expires_at
+            ),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+    ]
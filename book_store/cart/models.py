@@ -1,7 +1,46 @@
+from datetime import timedelta
+
 from django.conf import settings
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Prefetch, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from book.models import Book, StockMovement, StockSlot, slot_stock
+
+
+def default_expires_at():
+    """
+    Return the time at which a cart item created now stops being reserved.
+    """
+    return timezone.now() + timedelta(seconds=settings.CART_RESERVATION_TIMEOUT)
+
+
+LINE_TOTAL = ExpressionWrapper(
+    F("quantity") * F("book__price"),
+    output_field=DecimalField(max_digits=12, decimal_places=2),
+)
+
+
+class CartQuerySet(models.QuerySet):
+    def with_items(self):
+        """
+        Annotate the carts with their total and prefetch their items with their books.
 
-from book.models import Book
+        The total is summed by the database and every item carries its
+        `line_total`, so a cart is loaded in two queries whatever its number
+        of items.
+        """
+        total = Sum(
+            F("items__quantity") * F("items__book__price"),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        return self.annotate(
+            total=Coalesce(total, Value(0), output_field=total.output_field)
+        ).prefetch_related(
+            Prefetch("items", queryset=CartItem.objects.with_line_totals())
+        )
 
 
 class Cart(models.Model):
@@ -19,11 +58,179 @@ class Cart(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    objects = CartQuerySet.as_manager()
 
     def __str__(self):
         return f"Cart of {self.user.email}"
 
 
+class CartItemQuerySet(models.QuerySet):
+    def with_line_totals(self):
+        """
+        Join the items' books and annotate each item with its `line_total`.
+        """
+        return (
+            self.select_related("book")
+            .annotate(line_total=LINE_TOTAL)
+            .order_by("added_at", "pk")
+        )
+
+    def delete(self):
+        """
+        Delete the cart items and release their quantities from the books'
+        reserved counters in the same transaction.
+
+        The items are locked before they are deleted, so a reservation is
+        released exactly once even if the same items are removed concurrently.
+        """
+        with transaction.atomic(using=self.db):
+            rows = list(
+                self.select_for_update().values_list("pk", "book_id", "quantity")
+            )
+            if not rows:
+                return 0, {}
+
+            released = {}
+            for _, book_id, quantity in rows:
+                released[book_id] = released.get(book_id, 0) - quantity
+
+            result = (
+                self.model._base_manager.using(self.db)
+                .filter(pk__in=[pk for pk, _, _ in rows])
+                .delete()
+            )
+            Book.objects.db_manager(self.db).adjust_reserved(released)
+        return result
+
+    def check_out(self):
+        """
+        Check out the cart items: record their quantities in the stock ledger
+        and delete them without releasing their reservations.
+
+        Each checkout movement consumes the reservation of its item when it is
+        folded into the book, so checking out inserts movements and never
+        writes to the book rows.
+
+        Returns:
+            dict: Mapping of book id to the quantity checked out.
+        """
+        with transaction.atomic(using=self.db):
+            rows = list(
+                self.select_for_update(of=("self",)).values_list(
+                    "pk", "book_id", "quantity"
+                )
+            )
+            quantities = {}
+            for _, book_id, quantity in rows:
+                quantities[book_id] = quantities.get(book_id, 0) + quantity
+
+            self.model._base_manager.using(self.db).filter(
+                pk__in=[pk for pk, _, _ in rows]
+            ).delete()
+            StockMovement.objects.db_manager(self.db).record_checkout(quantities)
+        return quantities
+
+    def add_book(self, cart, book_id, quantity=1):
+        """
+        Add a book to a cart, reserving it with a single conditional write.
+
+        The item is inserted first, so the unique constraint on (cart, book)
+        rejects duplicates, and the reservation is then made by a guarded
+        counter update. If the book has no unreserved copy left the insert is
+        rolled back.
+
+        Args:
+            cart (Cart): The cart to add the book to.
+            book_id (int): Id of the book to add.
+            quantity (int): Number of copies to reserve.
+
+        Returns:
+            tuple: The created item (or None) and one of "added",
+            "already_in_cart" or "unavailable".
+        """
+        item = self.model(cart=cart, book_id=book_id, quantity=quantity)
+        try:
+            with transaction.atomic(using=self.db):
+                # Bypass CartItem.save(), so the reservation is made only once,
+                # after the insert has been checked for duplicates.
+                self.bulk_create([item])
+                if not Book.objects.db_manager(self.db).reserve(book_id, quantity):
+                    transaction.set_rollback(True, using=self.db)
+                    return None, "unavailable"
+        except IntegrityError:
+            return None, "already_in_cart"
+        return item, "added"
+
+    def add_books(self, cart, book_ids):
+        """
+        Add several books to a cart with a single availability read and a single insert.
+
+        The requested books are locked before the cart is checked for them and
+        while their availability is checked, so concurrent batches for the same
+        books are serialized, and the reserved counters of the added books are
+        updated in one query. Books whose row has no unreserved copy left are
+        reserved from their stock slots, one book at a time.
+
+        If an item is still inserted concurrently, by `add_book()` which does not
+        lock the book, the batch is rolled back and run again once, which then
+        reports the book as already in the cart.
+
+        Args:
+            cart (Cart): The cart to add the books to.
+            book_ids (list): Ids of the books to add.
+
+        Returns:
+            dict: Mapping of each requested book id to "added", "already_in_cart",
+            "unavailable" or "not_found".
+        """
+        book_ids = list(dict.fromkeys(book_ids))
+        try:
+            return self._add_books(cart, book_ids)
+        except IntegrityError:
+            return self._add_books(cart, book_ids)
+
+    def _add_books(self, cart, book_ids):
+        with transaction.atomic(using=self.db):
+            books = (
+                Book.objects.select_for_update()
+                .filter(pk__in=book_ids)
+                .annotate(unreserved=F("stock") - F("reserved"), slotted=slot_stock())
+                .values_list("pk", "unreserved", "slotted")
+            )
+            available = {pk: (unreserved, slotted) for pk, unreserved, slotted in books}
+            in_cart = set(
+                self.filter(cart=cart, book_id__in=book_ids).values_list(
+                    "book_id", flat=True
+                )
+            )
+
+            results = {}
+            items = []
+            for book_id in book_ids:
+                if book_id in in_cart:
+                    results[book_id] = "already_in_cart"
+                elif book_id not in available:
+                    results[book_id] = "not_found"
+                elif available[book_id][0] > 0 or (
+                    available[book_id][1] > 0
+                    and StockSlot.objects.db_manager(self.db).take(book_id)
+                ):
+                    results[book_id] = "added"
+                    items.append(self.model(cart=cart, book_id=book_id))
+                else:
+                    results[book_id] = "unavailable"
+
+            self.bulk_create(items)
+            Book.objects.db_manager(self.db).adjust_reserved(
+                {
+                    item.book_id: item.quantity
+                    for item in items
+                    if available[item.book_id][0] > 0
+                }
+            )
+        return results
+
+
 class CartItem(models.Model):
     """
     Represents an item in a shopping cart.
@@ -33,15 +240,75 @@ class CartItem(models.Model):
         book (ForeignKey): The book that is in the cart.
         quantity (PositiveIntegerField): The quantity of the book in the cart.
         added_at (DateTimeField): The date and time when the item was added to the cart.
+        expires_at (DateTimeField): The date and time when the reservation expires
+            and the item is released from the cart.
     """
 
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="items")
     book = models.ForeignKey(Book, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=default_expires_at, db_index=True)
+    objects = CartItemQuerySet.as_manager()
 
     class Meta:
         unique_together = ("cart", "book")
 
+    def save(self, *args, **kwargs):
+        """
+        Save the cart item, keeping the reserved counters of the books in step.
+
+        A created item reserves its quantity on its book. An updated item is
+        locked and its stored book and quantity are read first, so a change of
+        quantity, or of book, reserves or releases exactly the difference.
+        Copies are reserved with the same guarded update as `add_book()`, and
+        the save is rolled back when the book does not have enough of them.
+
+        Args:
+            *args: Variable length argument list.
+            **kwargs: Arbitrary keyword arguments.
+        """
+        using = kwargs.get("using")
+        update_fields = kwargs.get("update_fields")
+        with transaction.atomic(using=using):
+            stored = None
+            if not self._state.adding:
+                stored = (
+                    CartItem._base_manager.using(using or self._state.db)
+                    .select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("book_id", "quantity")
+                    .first()
+                )
+
+            book_id, quantity = self.book_id, self.quantity
+            deltas = {}
+            if stored is not None:
+                # Fields left out of update_fields keep their stored value.
+                if update_fields is not None:
+                    if not {"book", "book_id"} & set(update_fields):
+                        book_id = stored[0]
+                    if "quantity" not in update_fields:
+                        quantity = stored[1]
+                deltas[stored[0]] = -stored[1]
+            deltas[book_id] = deltas.get(book_id, 0) + quantity
+
+            super(CartItem, self).save(*args, **kwargs)
+            books = Book.objects.db_manager(self._state.db)
+            books.adjust_reserved(
+                {book_id: delta for book_id, delta in deltas.items() if delta < 0}
+            )
+            for book_id, delta in deltas.items():
+                if delta > 0 and not books.reserve(book_id, delta):
+                    raise ValidationError(
+                        "Not enough unreserved copies of the book are left."
+                    )
+
+    def delete(self, using=None, keep_parents=False):
+        """
+        Delete the cart item through its queryset so that its reservation is released.
+        """
+        return CartItem.objects.using(using).filter(pk=self.pk).delete()
+
     def __str__(self):
         return f"{self.quantity} x {self.book.title} in {self.cart.user.email}'s Cart"
@@ -4,6 +4,14 @@ from .models import Cart, CartItem
 
 
 class CartItemSerializer(serializers.ModelSerializer):
+    title = serializers.CharField(source="book.title", read_only=True)
+    price = serializers.DecimalField(
+        source="book.price", max_digits=6, decimal_places=2, read_only=True
+    )
+    line_total = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True
+    )
+
     class Meta:
         model = CartItem
         fields = "__all__"
@@ -29,6 +37,7 @@ class CartItemSerializer(serializers.ModelSerializer):
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
+    total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
 
     class Meta:
         model = Cart
@@ -48,3 +57,11 @@ class CartSerializer(serializers.ModelSerializer):
                     f"The book {item.book.title} is out of stock."
                 )
         return value
+
+
+class AddBooksToCartSerializer(serializers.Serializer):
+    book_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
@@ -0,0 +1,15 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import Cart
+
+
+@receiver(pre_delete, sender=Cart)
+def release_cart_items(sender, instance, **kwargs):
+    """
+    Release the reservations of a cart before it is deleted.
+
+    Deleting a user cascades to their cart and its items with a raw DELETE,
+    which would bypass the reserved-counter bookkeeping of CartItem.
+    """
+    instance.items.all().delete()
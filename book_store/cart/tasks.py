@@ -1,7 +1,9 @@
 import logging
 from celery import shared_task
+from django.utils import timezone
 
 from .models import CartItem
+from book_store.metrics import CART_ITEM_RELEASES, EXPIRED_CART_ITEMS_RELEASED
 
 
 logger = logging.getLogger(__name__)
@@ -18,12 +20,50 @@ def release_book_from_cart(cart_item_id):
     try:
         cart_item = CartItem.objects.get(id=cart_item_id)
         cart_item.delete()
+        CART_ITEM_RELEASES.labels("released").inc()
         logger.info(
             f"Cart item with ID {cart_item_id} successfully removed from the cart."
         )
     except CartItem.DoesNotExist:
+        CART_ITEM_RELEASES.labels("missing").inc()
         logger.warning(f"Cart item with ID {cart_item_id} does not exist.")
     except Exception as e:
+        CART_ITEM_RELEASES.labels("error").inc()
         logger.error(
             f"An error occurred while removing cart item with ID {cart_item_id}: {e}"
         )
+
+
+@shared_task
+def release_expired_cart_items(batch_size=500):
+    """
+    Periodic task to remove every cart item whose reservation has expired.
+
+    Expired items are deleted in batches of at most `batch_size` rows, each in
+    its own transaction, so a large backlog never holds locks for long.
+
+    Args:
+    batch_size (int): The maximum number of cart items deleted per batch.
+
+    Returns:
+    int: The number of cart items released.
+    """
+    now = timezone.now()
+    released = 0
+    while True:
+        batch = list(
+            CartItem.objects.filter(expires_at__lte=now)
+            .order_by("expires_at")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not batch:
+            break
+
+        deleted, _ = CartItem.objects.filter(pk__in=batch, expires_at__lte=now).delete()
+        released += deleted
+        if len(batch) < batch_size:
+            break
+
+    EXPIRED_CART_ITEMS_RELEASED.inc(released)
+    logger.info(f"Released {released} expired cart items.")
+    return released
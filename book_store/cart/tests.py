@@ -1,15 +1,28 @@
+import logging
 import pytest
+import threading
+import time
+from datetime import timedelta
 from unittest.mock import patch
 
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, connections
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
+from prometheus_client import REGISTRY
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from .models import Cart, CartItem
-from book.models import Book
+from .models import Cart, CartItem, CartItemQuerySet
+from book_store.db_routers import get_pin_key, is_pinned, pin_to_primary
+from book_store import log
+from book_store.log import KeyValueFormatter, QueueHandler, SamplingFilter
+from book_store.testing import capture_queries
+from book.models import Book, StockMovement
 from category.models import Category
-from cart.tasks import release_book_from_cart
+from cart.tasks import release_book_from_cart, release_expired_cart_items
 
 
 User = get_user_model()
@@ -53,28 +66,274 @@ def cart_item(cart, book, db):
     return CartItem.objects.create(cart=cart, book=book, quantity=1)
 
 
-def test_retrieve_cart(api_client, user, cart):
+def test_retrieve_cart(api_client, user, cart, query_budget):
     api_client.force_authenticate(user=user)
     url = reverse("cart")
-    response = api_client.get(url)
+    with query_budget(2):
+        response = api_client.get(url)
     assert response.status_code == status.HTTP_200_OK
     assert response.data["user"] == user.id
 
 
-def test_add_to_cart(api_client, user, book):
+def test_retrieve_cart_includes_book_details_and_totals(api_client, user, cart_item):
+    api_client.force_authenticate(user=user)
+    response = api_client.get(reverse("cart"))
+    assert response.status_code == status.HTTP_200_OK
+    item = response.data["items"][0]
+    assert item["book"] == cart_item.book_id
+    assert item["title"] == "Test Book"
+    assert item["price"] == "19.99"
+    assert item["line_total"] == "19.99"
+    assert response.data["total"] == "19.99"
+
+
+def test_retrieve_new_cart(api_client, user):
+    api_client.force_authenticate(user=user)
+    response = api_client.get(reverse("cart"))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["items"] == []
+    assert response.data["total"] == "0.00"
+    assert Cart.objects.filter(user=user).exists()
+
+
+@pytest.mark.parametrize("count", [1, 10])
+def test_retrieve_cart_query_count(api_client, user, cart, count, query_budget):
+    _fill_cart(cart, count)
+
+    api_client.force_authenticate(user=user)
+    with query_budget(2):
+        response = api_client.get(reverse("cart"))
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data["items"]) == count
+    assert response.data["total"] == f"{count * 2 * 9.99:.2f}"
+
+
+def test_add_to_cart(api_client, user, book, query_budget):
     api_client.force_authenticate(user=user)
     url = reverse("add-to-cart", kwargs={"book_id": book.id})
-    response = api_client.post(url)
+    with query_budget(10):
+        response = api_client.post(url)
     assert response.status_code == status.HTTP_201_CREATED
     assert CartItem.objects.filter(cart__user=user, book=book).exists()
 
 
-def test_remove_from_cart(api_client, user, cart_item):
+def test_add_to_cart_does_not_oversell(api_client, user, book):
+    Book.objects.filter(pk=book.pk).update(stock=1)
+    other = User.objects.create_user(email="other@example.com", password="password")
+    url = reverse("add-to-cart", kwargs={"book_id": book.id})
+
     api_client.force_authenticate(user=user)
-    url = reverse("remove-from-cart", kwargs={"book_id": cart_item.book.id})
+    assert api_client.post(url).status_code == status.HTTP_201_CREATED
+    assert api_client.post(url).status_code == status.HTTP_400_BAD_REQUEST
+    api_client.force_authenticate(user=other)
     response = api_client.post(url)
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["message"] == (
+        "This book is not available in sufficient quantity."
+    )
+    book.refresh_from_db()
+    assert book.reserved == 1
+    assert CartItem.objects.filter(book=book).count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_add_to_cart_does_not_oversell(book):
+    stock = 3
+    Book.objects.filter(pk=book.pk).update(stock=stock)
+    carts = [
+        Cart.objects.create(
+            user=User.objects.create_user(
+                email=f"buyer{index}@example.com", password="password"
+            )
+        )
+        for index in range(8)
+    ]
+    barrier = threading.Barrier(len(carts))
+    results = []
+
+    def add_to_cart(cart):
+        barrier.wait()
+        try:
+            while True:
+                try:
+                    _, result = CartItem.objects.add_book(cart, book.id)
+                    break
+                except OperationalError as error:
+                    # SQLite rejects concurrent writers instead of making them
+                    # wait, so the losers try again like a retrying client.
+                    if "locked" not in str(error):
+                        raise
+                    time.sleep(0.001)
+            results.append(result)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=add_to_cart, args=(cart,)) for cart in carts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    book.refresh_from_db()
+    assert len(results) == len(carts)
+    assert results.count("added") == stock
+    assert results.count("unavailable") == len(carts) - stock
+    assert book.reserved == stock <= book.stock
+    assert CartItem.objects.filter(book=book).count() == stock
+
+
+def test_add_books_to_cart(api_client, user, cart, cart_item):
+    other_cart = Cart.objects.create(
+        user=User.objects.create_user(email="other@example.com", password="password")
+    )
+    sold_out, *available = _fill_cart(other_cart, 3, stock=2)
+    Book.objects.filter(pk__in=[book.pk for book in available]).update(stock=5)
+    requested = [cart_item.book.id, sold_out.id, *[book.id for book in available], 9999]
+
+    api_client.force_authenticate(user=user)
+    response = api_client.post(
+        reverse("add-books-to-cart"), {"book_ids": requested}, format="json"
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.data["results"] == [
+        {"book_id": cart_item.book.id, "status": "already_in_cart"},
+        {"book_id": sold_out.id, "status": "unavailable"},
+        *[{"book_id": book.id, "status": "added"} for book in available],
+        {"book_id": 9999, "status": "not_found"},
+    ]
+    for book in available:
+        book.refresh_from_db()
+        assert book.reserved == 3
+        assert cart.items.filter(book=book).exists()
+    assert not cart.items.filter(book=sold_out).exists()
+
+
+def test_add_books_to_cart_retries_after_a_concurrent_insert(
+    api_client, user, cart, cart_item
+):
+    add_books = CartItemQuerySet._add_books
+    attempts = []
+
+    def add_books_after_a_race(self, cart, book_ids):
+        attempts.append(book_ids)
+        if len(attempts) == 1:
+            # The first attempt conflicts with an item committed meanwhile.
+            raise IntegrityError("UNIQUE constraint failed")
+        return add_books(self, cart, book_ids)
+
+    api_client.force_authenticate(user=user)
+    with patch.object(CartItemQuerySet, "_add_books", add_books_after_a_race):
+        response = api_client.post(
+            reverse("add-books-to-cart"),
+            {"book_ids": [cart_item.book.id]},
+            format="json",
+        )
+    assert len(attempts) == 2
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["results"] == [
+        {"book_id": cart_item.book.id, "status": "already_in_cart"}
+    ]
+
+
+def test_add_books_to_cart_nothing_added(api_client, user, cart, cart_item):
+    api_client.force_authenticate(user=user)
+    response = api_client.post(
+        reverse("add-books-to-cart"),
+        {"book_ids": [cart_item.book.id]},
+        format="json",
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.data["results"] == [
+        {"book_id": cart_item.book.id, "status": "already_in_cart"}
+    ]
+
+
+@pytest.mark.parametrize("count", [1, 10])
+def test_add_books_to_cart_query_count(api_client, user, cart, count, query_budget):
+    books = _fill_cart(
+        Cart.objects.create(
+            user=User.objects.create_user(
+                email="other@example.com", password="password"
+            )
+        ),
+        count,
+        stock=10,
+    )
+
+    api_client.force_authenticate(user=user)
+    with query_budget(8):
+        response = api_client.post(
+            reverse("add-books-to-cart"),
+            {"book_ids": [book.id for book in books]},
+            format="json",
+        )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert cart.items.count() == count
+
+
+def test_add_books_to_cart_requires_book_ids(api_client, user):
+    api_client.force_authenticate(user=user)
+    response = api_client.post(reverse("add-books-to-cart"), {}, format="json")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_changing_item_quantity_adjusts_reservation(cart_item):
+    book = cart_item.book
+    cart_item.quantity = 3
+    cart_item.save()
+    book.refresh_from_db()
+    assert book.reserved == 3
+
+    stale = CartItem.objects.get(pk=cart_item.pk)
+    cart_item.quantity = 2
+    cart_item.save()
+    stale.quantity = 4
+    stale.save()
+    book.refresh_from_db()
+    assert book.reserved == 4
+
+    stale.quantity = 1
+    stale.save(update_fields=["expires_at"])
+    book.refresh_from_db()
+    assert book.reserved == 4
+
+
+def test_raising_item_quantity_beyond_stock_is_rejected(cart_item):
+    book = cart_item.book
+    cart_item.quantity = book.stock + 1
+    with pytest.raises(ValidationError):
+        cart_item.save()
+
+    cart_item.refresh_from_db()
+    book.refresh_from_db()
+    assert (cart_item.quantity, book.reserved) == (1, 1)
+
+    cart_item.quantity = book.stock
+    cart_item.save()
+    book.refresh_from_db()
+    assert book.reserved == book.stock
+
+
+def test_delete_user_releases_reservations(user, cart_item):
+    book = cart_item.book
+    book.refresh_from_db()
+    assert book.reserved == 1
+
+    user.delete()
+    book.refresh_from_db()
+    assert book.reserved == 0
+
+
+def test_remove_from_cart(api_client, user, cart_item, query_budget):
+    api_client.force_authenticate(user=user)
+    url = reverse("remove-from-cart", kwargs={"book_id": cart_item.book.id})
+    with query_budget(8):
+        response = api_client.post(url)
     assert response.status_code == status.HTTP_200_OK
     assert not CartItem.objects.filter(pk=cart_item.pk).exists()
+    cart_item.book.refresh_from_db()
+    assert cart_item.book.reserved == 0
 
 
 def test_checkout(api_client, user, cart_item):
@@ -91,6 +350,60 @@ def test_checkout(api_client, user, cart_item):
     assert not cart.items.exists()
 
 
+def _fill_cart(cart, count, stock=5):
+    category = Category.objects.create(name=f"Category {count}")
+    books = [
+        Book.objects.create(
+            title=f"Book {index}",
+            author="Author",
+            year_published=2021,
+            category=category,
+            stock=stock,
+            price=9.99,
+        )
+        for index in range(count)
+    ]
+    for book in books:
+        CartItem.objects.create(cart=cart, book=book, quantity=2)
+    return books
+
+
+@pytest.mark.parametrize("count", [1, 10])
+def test_checkout_decrements_stock_of_every_item(
+    api_client, user, cart, count, query_budget
+):
+    books = _fill_cart(cart, count)
+
+    api_client.force_authenticate(user=user)
+    with query_budget(9):
+        response = api_client.post(reverse("checkout"))
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.data["items"]) == count
+    for book in Book.objects.with_current_stock().filter(pk__in=[b.pk for b in books]):
+        assert (book.stock, book.reserved, book.current_stock) == (5, 2, 3)
+    assert not cart.items.exists()
+
+    assert StockMovement.objects.fold() == count
+    for book in Book.objects.with_current_stock().filter(pk__in=[b.pk for b in books]):
+        assert (book.stock, book.reserved, book.current_stock) == (3, 0, 3)
+
+
+def test_checkout_out_of_stock_reports_items(api_client, user, cart):
+    books = _fill_cart(cart, 2)
+    Book.objects.filter(pk=books[0].pk).update(stock=1)
+
+    api_client.force_authenticate(user=user)
+    response = api_client.post(reverse("checkout"))
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    report = {item["book_id"]: item for item in response.data["items"]}
+    assert not report[books[0].pk]["in_stock"]
+    assert report[books[1].pk]["in_stock"]
+
+    books[1].refresh_from_db()
+    assert books[1].stock == 5
+    assert cart.items.count() == 2
+
+
 @pytest.mark.django_db
 def test_release_book_from_cart_success(cart_item):
     release_book_from_cart(cart_item.id)
@@ -114,3 +427,159 @@ def test_release_book_from_cart_exception(cart_item):
     ), patch("cart.tasks.logger") as mock_logger:
         release_book_from_cart(cart_item.id)
         mock_logger.error.assert_called()
+
+
+@pytest.mark.django_db
+def test_release_book_from_cart_counts_outcomes(cart_item):
+    def released(outcome):
+        return (
+            REGISTRY.get_sample_value(
+                "bookstore_cart_item_releases_total", {"outcome": outcome}
+            )
+            or 0
+        )
+
+    before = {outcome: released(outcome) for outcome in ("released", "missing")}
+    release_book_from_cart(cart_item.id)
+    release_book_from_cart(cart_item.id)
+    assert released("released") == before["released"] + 1
+    assert released("missing") == before["missing"] + 1
+
+
+@pytest.mark.django_db
+def test_release_expired_cart_items(cart):
+    books = _fill_cart(cart, 5)
+    CartItem.objects.filter(book__in=books[:3]).update(
+        expires_at=timezone.now() - timedelta(seconds=1)
+    )
+
+    released = release_expired_cart_items(batch_size=2)
+
+    assert released == 3
+    assert set(cart.items.values_list("book_id", flat=True)) == {
+        book.id for book in books[3:]
+    }
+    assert list(
+        Book.objects.filter(pk__in=[book.pk for book in books[:3]]).values_list(
+            "reserved", flat=True
+        )
+    ) == [0, 0, 0]
+
+
+def test_retrieve_cart_logs_structured_event(api_client, user, cart, caplog):
+    api_client.force_authenticate(user=user)
+    with caplog.at_level(logging.INFO, logger="cart.views"):
+        api_client.get(reverse("cart"))
+    (record,) = [r for r in caplog.records if r.name == "cart.views"]
+    assert record.getMessage() == f"Cart retrieved for user {user.email}"
+    assert record.event == "cart.retrieved"
+    assert record.user_id == user.pk
+
+
+def _make_record(level=logging.INFO, **fields):
+    record = logging.LogRecord(
+        "cart.views", level, __file__, 1, "Cart retrieved for user %s", ("a@b.c",), None
+    )
+    record.__dict__.update(fields)
+    return record
+
+
+def test_key_value_formatter():
+    line = KeyValueFormatter().format(
+        _make_record(event="cart.retrieved", user_id=7, note='say "hi"')
+    )
+    assert "level=INFO logger=cart.views" in line
+    assert 'msg="Cart retrieved for user a@b.c"' in line
+    assert 'event=cart.retrieved user_id=7 note="say \\"hi\\""' in line
+
+
+def test_sampling_filter():
+    sampling = SamplingFilter({"cart.retrieved": 0})
+    assert not sampling.filter(_make_record(event="cart.retrieved"))
+    assert sampling.filter(_make_record(logging.WARNING, event="cart.retrieved"))
+    assert sampling.filter(_make_record(event="cart.created"))
+    assert sampling.filter(_make_record())
+    assert SamplingFilter({"cart.retrieved": 1}).filter(
+        _make_record(event="cart.retrieved")
+    )
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def test_queue_handler_formats_on_listener():
+    target = ListHandler()
+    target.setFormatter(KeyValueFormatter())
+    handler = QueueHandler([target])
+    handler.handle(_make_record(event="cart.retrieved"))
+    handler.stop_listener()
+    assert len(target.lines) == 1
+    assert "event=cart.retrieved" in target.lines[0]
+
+
+def test_queue_handler_drops_records_when_full():
+    target = ListHandler()
+    handler = QueueHandler([target], maxsize=1)
+    handler.stop_listener()
+    handler.handle(_make_record())
+    handler.handle(_make_record())
+    assert handler.queue.qsize() == 1
+    assert handler.dropped == 1
+
+
+def test_queue_handler_registers_with_the_module_hooks():
+    handler = QueueHandler([ListHandler()])
+    assert handler in log._listening
+    handler.stop_listener()
+    assert handler not in log._listening
+
+
+def test_pin_is_seen_by_a_fresh_cache_client(user, settings, tmp_path):
+    # A file based cache stands in for Redis: like a worker in another
+    # process, a fresh client only sees what was stored in the backend.
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(tmp_path),
+        }
+    }
+    pin_to_primary(user)
+
+    other_worker = caches.create_connection(DEFAULT_CACHE_ALIAS)
+    assert other_worker.get(get_pin_key(user)) is not None
+    with patch("book_store.db_routers.cache", other_worker):
+        assert is_pinned(user)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cart_reads_stick_to_primary_after_a_write(api_client, user, book, replicas):
+    from django.core.cache import cache
+
+    api_client.force_authenticate(user=user)
+    with capture_queries("default", *replicas) as queries:
+        response = api_client.get(reverse("cart"))
+    assert response.status_code == status.HTTP_200_OK
+    assert response.data["items"] == []
+    assert len(queries["default"]) > 0
+
+    response = api_client.post(reverse("add-to-cart", args=[book.id]))
+    assert response.status_code == status.HTTP_201_CREATED
+
+    with capture_queries("default", *replicas) as queries:
+        response = api_client.get(reverse("cart"))
+    assert len(response.data["items"]) == 1
+    assert all(len(queries[alias]) == 0 for alias in replicas)
+
+    # Once the pin expires the cart is read from a replica.
+    cache.delete(get_pin_key(user))
+    with capture_queries("default", *replicas) as queries:
+        response = api_client.get(reverse("cart"))
+    assert len(response.data["items"]) == 1
+    assert len(queries["default"]) == 0
+    assert sum(len(queries[alias]) for alias in replicas) == 2
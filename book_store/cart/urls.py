@@ -1,8 +1,15 @@
 from django.urls import path
-from .views import AddToCartView, CheckoutView, CartView, RemoveFromCartView
+from .views import (
+    AddBooksToCartView,
+    AddToCartView,
+    CheckoutView,
+    CartView,
+    RemoveFromCartView,
+)
 
 urlpatterns = [
     path("", CartView.as_view(), name="cart"),
+    path("add-to-cart/", AddBooksToCartView.as_view(), name="add-books-to-cart"),
     path("add-to-cart/<int:book_id>/", AddToCartView.as_view(), name="add-to-cart"),
     path(
         "remove-from-cart/<int:book_id>/",
@@ -7,13 +7,14 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .models import Cart, CartItem
-from .serializers import CartSerializer
-from .tasks import release_book_from_cart
+from .serializers import AddBooksToCartSerializer, CartSerializer
 from book.models import Book
+from book_store.db_routers import ReplicaReadMixin
+
 logger = logging.getLogger(__name__)
 
 
-class CartView(generics.RetrieveAPIView):
+class CartView(ReplicaReadMixin, generics.RetrieveAPIView):
     """
     API view for retrieving a user's cart.
     """
@@ -23,15 +24,27 @@ class CartView(generics.RetrieveAPIView):
 
     def get_object(self):
         """
-        Get or create a cart for the current user.
+        Get or create a cart for the current user, with its items and total.
+
+        An existing cart is loaded in two queries whatever its number of items.
         """
         user = self.request.user
-        cart, created = Cart.objects.get_or_create(user=user)
+        cart = Cart.objects.with_items().filter(user=user).first()
 
-        if created:
-            logger.info(f"New cart created for user {user.email}")
+        if cart is None:
+            cart, _ = Cart.objects.get_or_create(user=user)
+            cart = Cart.objects.with_items().get(pk=cart.pk)
+            logger.info(
+                "New cart created for user %s",
+                user.email,
+                extra={"event": "cart.created", "user_id": user.pk},
+            )
         else:
-            logger.info(f"Cart retrieved for user {user.email}")
+            logger.info(
+                "Cart retrieved for user %s",
+                user.email,
+                extra={"event": "cart.retrieved", "user_id": user.pk},
+            )
 
         return cart
 
@@ -51,38 +64,120 @@ class AddToCartView(APIView):
         cart, created = Cart.objects.get_or_create(user=user)
 
         if created:
-            logger.info(f"New cart created for user {user.email}")
+            logger.info(
+                "New cart created for user %s",
+                user.email,
+                extra={"event": "cart.created", "user_id": user.pk},
+            )
+
+        book = get_object_or_404(Book, pk=book_id)
+        cart_item, result = CartItem.objects.add_book(cart, book.id)
 
-        if CartItem.objects.filter(cart=cart, book_id=book_id).exists():
+        if result == "already_in_cart":
             logger.warning(
-                f"User {user.email} attempted to add book {book_id} which is already in their cart"
+                "User %s attempted to add book %s which is already in their cart",
+                user.email,
+                book_id,
+                extra={
+                    "event": "cart.already_in_cart",
+                    "user_id": user.pk,
+                    "book_id": book_id,
+                },
             )
             return Response(
                 {"message": "This book is already in your cart."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        book = get_object_or_404(Book, pk=book_id)
-
-        if not Book.objects.with_effective_stock().filter(id=book.id).exists():
+        if result == "unavailable":
             logger.info(
-                f"Book {book_id} not available in sufficient quantity for user {user.email}"
+                "Book %s not available in sufficient quantity for user %s",
+                book_id,
+                user.email,
+                extra={
+                    "event": "cart.book_unavailable",
+                    "user_id": user.pk,
+                    "book_id": book_id,
+                },
             )
             return Response(
                 {"message": "This book is not available in sufficient quantity."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        cart_item = CartItem.objects.create(cart=cart, book=book)
-        logger.info(f"Book {book_id} added to cart for user {user.email}")
+        logger.info(
+            "Book %s added to cart for user %s until %s",
+            book_id,
+            user.email,
+            cart_item.expires_at,
+            extra={
+                "event": "cart.book_added",
+                "user_id": user.pk,
+                "book_id": book_id,
+            },
+        )
 
-        release_book_from_cart.apply_async((cart_item.id,), countdown=1800)
         return Response(
             {"message": "This book added to cart."},
             status=status.HTTP_201_CREATED,
         )
 
 
+class AddBooksToCartView(APIView):
+    """
+    API view for adding several books to the user's cart at once.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        """
+        Handle POST request to add the books listed in `book_ids` to the cart.
+
+        Availability is checked for the whole batch with one query and the
+        items are inserted with one bulk insert. The response reports the
+        outcome for every requested book.
+        """
+        serializer = AddBooksToCartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        user = request.user
+        cart, created = Cart.objects.get_or_create(user=user)
+        if created:
+            logger.info(
+                "New cart created for user %s",
+                user.email,
+                extra={"event": "cart.created", "user_id": user.pk},
+            )
+
+        results = CartItem.objects.add_books(
+            cart, serializer.validated_data["book_ids"]
+        )
+        added = [book_id for book_id, result in results.items() if result == "added"]
+        logger.info(
+            "Books %s added to cart for user %s",
+            added,
+            user.email,
+            extra={
+                "event": "cart.books_added",
+                "user_id": user.pk,
+                "added": len(added),
+                "requested": len(results),
+            },
+        )
+
+        return Response(
+            {
+                "message": f"{len(added)} of {len(results)} books added to cart.",
+                "results": [
+                    {"book_id": book_id, "status": result}
+                    for book_id, result in results.items()
+                ],
+            },
+            status=status.HTTP_201_CREATED if added else status.HTTP_400_BAD_REQUEST,
+        )
+
+
 class RemoveFromCartView(APIView):
     """
     API view for removing a book from the user's cart.
@@ -100,14 +195,30 @@ class RemoveFromCartView(APIView):
         try:
             cart_item = CartItem.objects.get(cart=cart, book_id=book_id)
             cart_item.delete()
-            logger.info(f"User {user.email} removed book id {book_id} from their cart.")
+            logger.info(
+                "User %s removed book id %s from their cart.",
+                user.email,
+                book_id,
+                extra={
+                    "event": "cart.book_removed",
+                    "user_id": user.pk,
+                    "book_id": book_id,
+                },
+            )
             return Response(
                 {"message": "The book has been removed from your cart."},
                 status=status.HTTP_200_OK,
             )
         except CartItem.DoesNotExist:
             logger.warning(
-                f"User {user.email} attempted to remove a non-existent book id {book_id} from their cart."
+                "User %s attempted to remove a non-existent book id %s from their cart.",
+                user.email,
+                book_id,
+                extra={
+                    "event": "cart.not_in_cart",
+                    "user_id": user.pk,
+                    "book_id": book_id,
+                },
             )
             return Response(
                 {"message": "This book is not in your cart."},
@@ -125,42 +236,82 @@ class CheckoutView(APIView):
     def post(self, request):
         """
         Handle POST request to checkout the items in the cart.
+
+        The cart items are locked and their books' current stock is read with
+        one query. The sale is then recorded as checkout movements in the stock
+        ledger with a single insert, so concurrent checkouts of the same book do
+        not wait on its row: the items' reservations already guarantee that the
+        stock covers them.
         """
         user = request.user
         with transaction.atomic():
-            cart = Cart.objects.filter(user=user).first()
-            if not cart or not cart.items.exists():
+            quantities = dict(
+                CartItem.objects.select_for_update(of=("self",))
+                .filter(cart__user=user)
+                .values_list("book_id", "quantity")
+            )
+            if not quantities:
                 logger.info(
-                    f"Checkout attempted by user {user.email} with an empty cart."
+                    "Checkout attempted by user %s with an empty cart.",
+                    user.email,
+                    extra={"event": "cart.checkout_empty", "user_id": user.pk},
                 )
                 return Response(
                     {"message": "No items in the cart to checkout."},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            out_of_stock_items = []
-            for item in cart.items.all():
-                book = item.book
-                if book.stock >= item.quantity:
-                    book.stock -= item.quantity
-                    book.save(update_stock=True)
-                else:
-                    out_of_stock_items.append(book.title)
+            books = (
+                Book.objects.with_current_stock()
+                .filter(pk__in=quantities)
+                .order_by("pk")
+                .values("id", "title", "current_stock")
+            )
+            items = [
+                {
+                    "book_id": book["id"],
+                    "title": book["title"],
+                    "requested": quantities[book["id"]],
+                    "available": book["current_stock"],
+                    "in_stock": book["current_stock"] >= quantities[book["id"]],
+                }
+                for book in books
+            ]
+            out_of_stock_items = [
+                item["title"] for item in items if not item["in_stock"]
+            ]
 
             if out_of_stock_items:
                 transaction.set_rollback(True)
                 logger.warning(
-                    f"Checkout failed for user {user.email} due to out-of-stock items: {', '.join(out_of_stock_items)}"
+                    "Checkout failed for user %s due to out-of-stock items: %s",
+                    user.email,
+                    ", ".join(out_of_stock_items),
+                    extra={
+                        "event": "cart.checkout_out_of_stock",
+                        "user_id": user.pk,
+                        "items": len(out_of_stock_items),
+                    },
                 )
                 return Response(
                     {
-                        "message": f"Book {', '.join(out_of_stock_items)} is out of stock."
+                        "message": f"Book {', '.join(out_of_stock_items)} is out of stock.",
+                        "items": items,
                     },
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            cart.items.all().delete()
-            logger.info(f"Checkout successful for user {user.email}.")
+            CartItem.objects.filter(cart__user=user).check_out()
+            logger.info(
+                "Checkout successful for user %s.",
+                user.email,
+                extra={
+                    "event": "cart.checkout_succeeded",
+                    "user_id": user.pk,
+                    "items": len(items),
+                },
+            )
             return Response(
-                {"message": "Checkout successful."}, status=status.HTTP_200_OK
+                {"message": "Checkout successful.", "items": items},
+                status=status.HTTP_200_OK,
             )
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+def backfill_counts(apps, schema_editor):
+    Category = apps.get_model("category", "Category")
+    db_alias = schema_editor.connection.alias
+
+    categories = list(
+        Category.objects.using(db_alias).annotate(
+            actual_book_count=Count("books"),
+            actual_in_stock_count=Count(
+                "books", filter=Q(books__stock__gt=F("books__reserved"))
+            ),
+        )
+    )
+    for category in categories:
+        category.book_count = category.actual_book_count
+        category.in_stock_count = category.actual_in_stock_count
+    Category.objects.using(db_alias).bulk_update(
+        categories, ["book_count", "in_stock_count"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("category", "0001_initial"),
+        ("book", "0004_book_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="book_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="in_stock_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
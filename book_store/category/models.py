@@ -1,4 +1,85 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+
+from book_store.cache import invalidate
+
+
+class CategoryManager(models.Manager):
+    def adjust_counts(self, book_counts=None, in_stock_counts=None):
+        """
+        Apply changes to the book and in-stock counts of several categories in a single UPDATE.
+
+        Args:
+            book_counts (dict): Mapping of category id to the signed change of
+                its book count.
+            in_stock_counts (dict): Mapping of category id to the signed change
+                of its in-stock count.
+
+        Returns:
+            int: The number of categories updated.
+        """
+        changes = {}
+        category_ids = set()
+        for field, deltas in (
+            ("book_count", book_counts or {}),
+            ("in_stock_count", in_stock_counts or {}),
+        ):
+            deltas = {pk: delta for pk, delta in deltas.items() if delta}
+            if deltas:
+                changes[field] = Case(
+                    *[
+                        When(pk=pk, then=F(field) + Value(delta))
+                        for pk, delta in deltas.items()
+                    ],
+                    default=F(field),
+                    output_field=IntegerField(),
+                )
+                category_ids.update(deltas)
+        if not changes:
+            return 0
+
+        updated = self.filter(pk__in=category_ids).update(**changes)
+        invalidate("categories")
+        return updated
+
+    def reconcile_counts(self):
+        """
+        Recount the books of every category and correct the counts that drifted.
+
+        The categories are locked first, so incremental changes made meanwhile
+        wait and are applied on top of the recounted values. A book is in stock
+        when it is returned by `Book.objects.with_effective_stock()`, which also
+        counts the copies held in its stock slots.
+
+        Returns:
+            int: The number of categories whose counts were corrected.
+        """
+        with transaction.atomic(using=self.db):
+            list(self.select_for_update().values_list("pk", flat=True))
+            in_stock = (
+                self.model._meta.get_field("books")
+                .related_model.objects.with_effective_stock()
+                .values("pk")
+            )
+            categories = self.annotate(
+                actual_book_count=Count("books"),
+                actual_in_stock_count=Count("books", filter=Q(books__in=in_stock)),
+            ).only("book_count", "in_stock_count")
+
+            drifted = []
+            for category in categories:
+                if (category.book_count, category.in_stock_count) != (
+                    category.actual_book_count,
+                    category.actual_in_stock_count,
+                ):
+                    category.book_count = category.actual_book_count
+                    category.in_stock_count = category.actual_in_stock_count
+                    drifted.append(category)
+
+            if drifted:
+                self.bulk_update(drifted, ["book_count", "in_stock_count"])
+                invalidate("categories")
+        return len(drifted)
 
 
 class Category(models.Model):
@@ -7,17 +88,40 @@ class Category(models.Model):
 
     Attributes:
         name (CharField): The name of the category.
+        book_count (IntegerField): Number of books in the category, maintained by the book models.
+        in_stock_count (IntegerField): Number of those books with unreserved stock left.
         created_at (DateTimeField): The date and time the category was created. Automatically set when the object is created.
         updated_at (DateTimeField): The date and time the category was last updated. Automatically set when the object is saved.
     """
 
+    COUNT_FIELDS = ("book_count", "in_stock_count")
+
     name = models.CharField(max_length=100, unique=True)
+    book_count = models.IntegerField(default=0, editable=False)
+    in_stock_count = models.IntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CategoryManager()
+
     class Meta:
         verbose_name_plural = "Categories"
 
+    def save(self, *args, **kwargs):
+        """
+        Save the category without writing back its counts.
+
+        The counts are only changed through CategoryManager, so a stale instance
+        must never overwrite them.
+        """
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNT_FIELDS
+            ]
+        super(Category, self).save(*args, **kwargs)
+
     def __str__(self):
         """
         Return the string representation of the Category, which is its name.
@@ -0,0 +1,33 @@
+import logging
+from celery import shared_task
+
+from .models import Category
+
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_category_counts():
+    """
+    Periodic task to recount the books of every category and correct drifted counts.
+
+    The counts are maintained incrementally, but changes that bypass the models,
+    such as raw queryset updates of the stock, are only caught up here.
+
+    Returns:
+    int: The number of categories whose counts were corrected.
+    """
+    corrected = Category.objects.reconcile_counts()
+    if corrected:
+        logger.warning(
+            "Corrected the book counts of %s categories.",
+            corrected,
+            extra={"event": "category.counts_corrected", "corrected": corrected},
+        )
+    else:
+        logger.info(
+            "Category book counts are up to date.",
+            extra={"event": "category.counts_checked"},
+        )
+    return corrected
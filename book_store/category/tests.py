@@ -1,9 +1,16 @@
+import logging
+
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
 from .models import Category
+from .tasks import reconcile_category_counts
+from book.models import Book
+from cart.models import Cart, CartItem
 
 User = get_user_model()
 
@@ -26,12 +33,37 @@ class TestCategoryViewSet:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data) == 1
 
+    def test_async_list_and_retrieve_categories(self):
+        response = self.client.get(reverse("category-async-list"))
+        assert response.status_code == status.HTTP_200_OK
+        assert [category["name"] for category in response.json()] == ["Fiction"]
+
+        url = reverse("category-async-detail", kwargs={"pk": self.category.id})
+        response = self.client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["name"] == self.category.name
+
+        url = reverse("category-async-detail", kwargs={"pk": self.category.id + 1})
+        assert self.client.get(url).status_code == status.HTTP_404_NOT_FOUND
+
     def test_retrieve_category(self):
         url = reverse("category-detail", kwargs={"pk": self.category.id})
         response = self.client.get(url)
         assert response.status_code == status.HTTP_200_OK
         assert response.data["name"] == self.category.name
 
+    def test_retrieve_category_not_modified(self):
+        url = reverse("category-detail", kwargs={"pk": self.category.id})
+        response = self.client.get(url)
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+
+        self.category.name = "Renamed"
+        self.category.save()
+        updated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        assert updated.status_code == status.HTTP_200_OK
+        assert updated.data["name"] == "Renamed"
+
     def test_create_category_unauthorized(self):
         url = reverse("category-list")
         data = {"name": "New Category"}
@@ -71,3 +103,120 @@ class TestCategoryViewSet:
         response = self.client.delete(url)
         assert response.status_code == status.HTTP_204_NO_CONTENT
         assert not Category.objects.filter(pk=self.category.id).exists()
+
+
+@pytest.mark.django_db
+class TestCategoryCounts:
+    def setup_method(self):
+        self.client = APIClient()
+        self.fiction = Category.objects.create(name="Fiction")
+        self.poetry = Category.objects.create(name="Poetry")
+        self.books = [
+            Book.objects.create(
+                title=f"Book {index}",
+                author="Author",
+                year_published=2021,
+                category=self.fiction,
+                stock=index,
+                price=9.99,
+            )
+            for index in range(3)
+        ]
+
+    def assert_counts(self, category, book_count, in_stock_count):
+        category.refresh_from_db()
+        assert (category.book_count, category.in_stock_count) == (
+            book_count,
+            in_stock_count,
+        )
+
+    def test_counts_follow_book_changes(self):
+        self.assert_counts(self.fiction, 3, 2)
+
+        book = Book.objects.get(pk=self.books[1].pk)
+        book.stock = 0
+        book.save(update_stock=True)
+        self.assert_counts(self.fiction, 3, 1)
+
+        book = Book.objects.get(pk=self.books[2].pk)
+        book.category = self.poetry
+        book.save()
+        self.assert_counts(self.fiction, 2, 0)
+        self.assert_counts(self.poetry, 1, 1)
+
+        Book.objects.get(pk=self.books[2].pk).delete()
+        self.assert_counts(self.poetry, 0, 0)
+
+    def test_counts_follow_reservations_and_checkout(self):
+        user = User.objects.create_user(email="buyer@example.com", password="password")
+        cart = Cart.objects.create(user=user)
+        item = CartItem.objects.create(cart=cart, book=self.books[1], quantity=1)
+        self.assert_counts(self.fiction, 3, 1)
+
+        item.delete()
+        self.assert_counts(self.fiction, 3, 2)
+
+        CartItem.objects.create(cart=cart, book=self.books[2], quantity=2)
+        self.client.force_authenticate(user=user)
+        response = self.client.post(reverse("checkout"))
+        assert response.status_code == status.HTTP_200_OK
+        self.assert_counts(self.fiction, 3, 1)
+
+    def test_moving_a_stale_book_counts_its_current_availability(self):
+        book = Book.objects.get(pk=self.books[1].pk)
+        Book.objects.reserve(book.pk)
+        self.assert_counts(self.fiction, 3, 1)
+
+        book.category = self.poetry
+        book.save()
+        self.assert_counts(self.fiction, 2, 1)
+        self.assert_counts(self.poetry, 1, 0)
+
+    def test_reconcile_corrects_drift(self, caplog):
+        Book.objects.filter(pk=self.books[1].pk).update(stock=0)
+        Category.objects.filter(pk=self.poetry.pk).update(book_count=7)
+
+        with caplog.at_level(logging.INFO, logger="category.tasks"):
+            assert reconcile_category_counts() == 2
+        (record,) = [r for r in caplog.records if r.name == "category.tasks"]
+        assert record.getMessage() == "Corrected the book counts of 2 categories."
+        assert (record.event, record.corrected) == ("category.counts_corrected", 2)
+        self.assert_counts(self.fiction, 3, 1)
+        self.assert_counts(self.poetry, 0, 0)
+        assert reconcile_category_counts() == 0
+
+    def test_saving_a_stale_category_keeps_counts(self):
+        category = Category.objects.get(pk=self.poetry.pk)
+        Book.objects.create(
+            title="Poems",
+            author="Poet",
+            year_published=2021,
+            category=self.poetry,
+            stock=1,
+            price=9.99,
+        )
+        category.name = "Poems"
+        category.save()
+        self.assert_counts(self.poetry, 1, 1)
+
+    def test_list_exposes_counts_with_one_query(self):
+        url = reverse("category-list")
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        assert len(context.captured_queries) == 1
+        assert [
+            (category["name"], category["book_count"], category["in_stock_count"])
+            for category in response.data
+        ] == [("Fiction", 3, 2), ("Poetry", 0, 0)]
+
+        self.books[0].delete()
+        response = self.client.get(url)
+        assert response.data[0]["book_count"] == 2
+
+    def test_list_is_paginated_on_request(self):
+        response = self.client.get(f"{reverse('category-list')}?page_size=1")
+        assert response.data["count"] == 2
+        assert [category["name"] for category in response.data["results"]] == [
+            "Fiction"
+        ]
+        assert response.data["next"] is not None
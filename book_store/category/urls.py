@@ -1,10 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet
+from .views import AsyncCategoryView, CategoryViewSet
 
 router = DefaultRouter()
 router.register(r"", CategoryViewSet)
 
 urlpatterns = [
+    path("async/", AsyncCategoryView.as_view(), name="category-async-list"),
+    path("async/<int:pk>/", AsyncCategoryView.as_view(), name="category-async-detail"),
     path("", include(router.urls)),
 ]
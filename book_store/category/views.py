@@ -1,16 +1,25 @@
 from rest_framework import permissions, viewsets
 
 from .models import Category
+from .pagination import OptionalPageNumberPagination
 from .serializers import CategorySerializer
+from book_store.async_views import AsyncReadOnlyView
+from book_store.cache import CachedResponseMixin
+from book_store.db_routers import ReplicaReadMixin
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """
     A viewset for viewing and editing category instances.
+
+    Categories are listed by name with their maintained book and in-stock
+    counts, and are paginated when the client passes `page` or `page_size`.
     """
 
-    queryset = Category.objects.all()
+    queryset = Category.objects.order_by("name")
     serializer_class = CategorySerializer
+    pagination_class = OptionalPageNumberPagination
+    cache_namespace = "categories"
 
     def get_permissions(self):
         """
@@ -24,3 +33,12 @@ class CategoryViewSet(viewsets.ModelViewSet):
         else:
             permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
         return [permission() for permission in permission_classes]
+
+
+class AsyncCategoryView(AsyncReadOnlyView):
+    """
+    Async list and retrieve views of the categories, using the async ORM.
+    """
+
+    queryset = Category.objects.order_by("name")
+    serializer_class = CategorySerializer
@@ -0,0 +1,55 @@
+import pytest
+from django.core.cache import cache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Start every test with an empty cache so cached responses do not leak between tests.
+    """
+    from account.authentication import local_cache
+
+    cache.clear()
+    local_cache.clear()
+    yield
+    cache.clear()
+    local_cache.clear()
+
+
+@pytest.fixture
+def query_budget(db):
+    """
+    Return the `book_store.testing.query_budget` context manager.
+
+    Wrap a request in `with query_budget(max_queries, per_item=0, items=0):`
+    to fail the test, with the offending SQL grouped by template, when it runs
+    more queries than allowed.
+    """
+    from book_store.testing import query_budget
+
+    return query_budget
+
+
+@pytest.fixture
+def replicas(settings):
+    """
+    Add two replicas mirroring the test database and let reads go to them.
+
+    The replicas use connections of their own, so they only see committed
+    data: use this fixture in `@pytest.mark.django_db(transaction=True)` tests.
+    """
+    from django.db import connections
+
+    aliases = ["replica_1", "replica_2"]
+    primary = connections["default"].settings_dict
+    for alias in aliases:
+        connections.settings[alias] = {
+            **primary,
+            "TEST": {**primary["TEST"], "MIRROR": "default"},
+        }
+    settings.REPLICA_DATABASES = aliases
+    yield aliases
+    for alias in aliases:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]